@@ -0,0 +1,240 @@
+import argparse, json, math, os, random, time
+from concurrent.futures import ProcessPoolExecutor
+from chess.chess_functions import *
+from chess.zobrist import compute_hash
+import chess.botV1 as botV1
+import chess.botV2 as botV2
+from chess.transposition import TablePool
+
+# Self-play arena: N games between two engine configurations, played in
+# parallel worker processes. Games come in pairs that start from the same
+# random opening with colours swapped, and end on checkmate or stalemate,
+# when a position repeats, or when the ply limit is hit (then the
+# side ahead on material by ADJUDICATION_MARGIN wins). Reports W/D/L for the
+# first engine, time per move and nodes per second for each.
+# Run from the backend folder:
+#   python -m benchmarks.arena --engine-a "v2:depth=4" --engine-b "v2:depth=5,quiescence=0" --games 20
+#   python -m benchmarks.arena --engine-a v2:depth=2 --engine-b v1 --games 10 --workers 4
+
+DEFAULT_MAX_PLIES = 200
+DEFAULT_OPENING_PLIES = 2
+REPETITION_LIMIT = 3
+ADJUDICATION_MARGIN = 3
+
+# short option names accepted in engine specs
+OPTION_NAMES = {
+    "depth" : ("max_depth", int),
+    "time" : ("time_limit", float),
+    "nodes" : ("node_limit", int),
+    "backend" : ("backend", str),
+    "quiescence" : ("quiescence", lambda value: value not in ("0", "false", "no")),
+    "book" : ("use_book", lambda value: value not in ("0", "false", "no")),
+    "eval" : ("evaluator", str),
+    "tb" : ("use_tablebase", lambda value: value not in ("0", "false", "no")),
+}
+
+
+def parse_engine(spec, label):
+    """
+    'v1' or 'v2:depth=4,time=0.5,backend=bitboard,quiescence=0,book=1,eval=tables,tb=0'.
+    Returns {"label", "name", "engine", "options"}; label ("a" or "b") tells
+    the two engines apart even when their specs are the same.
+    """
+    engine, _, option_text = spec.partition(":")
+    if engine not in ENGINES:
+        raise ValueError(f"unknown engine {engine}")
+    if engine == "v1" and option_text:
+        raise ValueError("v1 takes no options")
+    options = {"use_book" : False} if engine == "v2" else {}
+    for item in filter(None, option_text.split(",")):
+        name, _, value = item.partition("=")
+        if name not in OPTION_NAMES:
+            raise ValueError(f"unknown engine option {name}")
+        key, convert = OPTION_NAMES[name]
+        options[key] = convert(value)
+    return {"label" : label, "name" : spec, "engine" : engine, "options" : options}
+
+
+def play_v1(game, options, tables, seed):
+    # botV1 searches a copy of the game and does not count nodes
+    random.seed(seed)
+    return botV1.get_bot_move(game, game["turn"]), None
+
+
+def play_v2(game, options, tables, seed):
+    # each engine keeps its own tables for the whole game, warm from its
+    # earlier moves and never the other engine's (a search seed would clear
+    # them every move); ties are broken by the seeded random module instead
+    botV2.TRANSPOSITION_TABLES = tables
+    random.seed(seed)
+    result = botV2.search_best_move(game, **options)
+    return result["move"], result["nodes"]
+
+
+ENGINES = {
+    "v1" : play_v1,
+    "v2" : play_v2,
+}
+
+
+def new_engine_record():
+    return {"moves" : 0, "seconds" : 0.0, "nodes" : 0, "counted_seconds" : 0.0}
+
+
+def adjudicate(board):
+    """
+    Result at the ply limit: the side ahead by ADJUDICATION_MARGIN wins.
+    """
+    material = count_material(board)
+    difference = material[Colour.WHITE] - material[Colour.BLACK]
+    if difference >= ADJUDICATION_MARGIN:
+        return "white"
+    if difference <= -ADJUDICATION_MARGIN:
+        return "black"
+    return "draw"
+
+
+def play_game(white, black, seed, opening_plies = DEFAULT_OPENING_PLIES, max_plies = DEFAULT_MAX_PLIES):
+    """
+    One game between two parsed engines. Returns the winner ("white",
+    "black" or "draw"), the labels of the engines on each side, the reason,
+    the number of plies and per-colour move, time and node totals.
+    """
+    rng = random.Random(seed)
+    game = new_game()
+    for ply in range(opening_plies):
+        move_piece(game, rng.choice(botV2.get_all_possible_moves(game)))
+
+    engines = {Colour.WHITE : white, Colour.BLACK : black}
+    records = {Colour.WHITE : new_engine_record(), Colour.BLACK : new_engine_record()}
+    tables = {Colour.WHITE : TablePool(), Colour.BLACK : TablePool()}
+    seen = {}
+    winner, reason = None, None
+    for ply in range(opening_plies, max_plies):
+        turn = game["turn"]
+        board = game["board"]
+        status = get_game_status(board, turn)
+        if status == "checkmate":
+            winner, reason = ("black" if turn == Colour.WHITE else "white"), "checkmate"
+            break
+        if status == "stalemate":
+            winner, reason = "draw", "stalemate"
+            break
+        key = compute_hash(board, turn)
+        seen[key] = seen.get(key, 0) + 1
+        if seen[key] >= REPETITION_LIMIT:
+            winner, reason = "draw", "repetition"
+            break
+
+        engine = engines[turn]
+        start = time.perf_counter()
+        move, nodes = ENGINES[engine["engine"]](game, engine["options"], tables[turn], seed * 1000 + ply)
+        elapsed = time.perf_counter() - start
+        record = records[turn]
+        record["moves"] += 1
+        record["seconds"] += elapsed
+        if nodes is not None:
+            record["nodes"] += nodes
+            record["counted_seconds"] += elapsed
+        move_piece(game, move)
+
+    if winner is None:
+        winner, reason = adjudicate(game["board"]), "ply limit"
+    return {
+        "seed" : seed,
+        "white" : white["label"],
+        "black" : black["label"],
+        "winner" : winner,
+        "reason" : reason,
+        "plies" : len(game["moves"]),
+        "white_record" : records[Colour.WHITE],
+        "black_record" : records[Colour.BLACK],
+    }
+
+
+def run_arena(engine_a, engine_b, games, workers = 1, seed = 0, opening_plies = DEFAULT_OPENING_PLIES, max_plies = DEFAULT_MAX_PLIES):
+    """
+    Plays games (rounded up to an even number) and returns their results.
+    Game 2k and 2k+1 share an opening, with engine_a white in the first.
+    """
+    pairings = []
+    for pair in range((games + 1) // 2):
+        pairings.append((engine_a, engine_b, seed + pair, opening_plies, max_plies))
+        pairings.append((engine_b, engine_a, seed + pair, opening_plies, max_plies))
+    if workers <= 1:
+        return [play_game(*pairing) for pairing in pairings]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(play_game, *zip(*pairings)))
+
+
+def summarize(results, engine_a, engine_b):
+    """
+    W/D/L from engine_a's side, its score and Elo difference, and time per
+    move and nodes per second for each engine.
+    """
+    summary = {"wins" : 0, "draws" : 0, "losses" : 0, "reasons" : {}}
+    totals = {engine_a["label"] : new_engine_record(), engine_b["label"] : new_engine_record()}
+    for result in results:
+        if result["winner"] == "draw":
+            summary["draws"] += 1
+        elif result[result["winner"]] == engine_a["label"]:
+            summary["wins"] += 1
+        else:
+            summary["losses"] += 1
+        summary["reasons"][result["reason"]] = summary["reasons"].get(result["reason"], 0) + 1
+        for colour in ("white", "black"):
+            total = totals[result[colour]]
+            for name, value in result[f"{colour}_record"].items():
+                total[name] += value
+
+    games = len(results)
+    score = (summary["wins"] + summary["draws"] / 2) / games if games else None
+    summary["score"] = score
+    summary["elo"] = -400 * math.log10(1 / score - 1) if score is not None and 0 < score < 1 else None
+    names = {engine_a["label"] : engine_a["name"], engine_b["label"] : engine_b["name"]}
+    summary["engines"] = {}
+    for label, total in totals.items():
+        summary["engines"][label] = {
+            "name" : names[label],
+            "moves" : total["moves"],
+            "seconds_per_move" : total["seconds"] / total["moves"] if total["moves"] else None,
+            "nodes_per_second" : total["nodes"] / total["counted_seconds"] if total["counted_seconds"] > 0 else None,
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play two engine configurations against each other")
+    parser.add_argument("--engine-a", required=True, help="e.g. 'v2:depth=4,time=0.5' or 'v1'")
+    parser.add_argument("--engine-b", required=True)
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--opening-plies", type=int, default=DEFAULT_OPENING_PLIES, help="random plies before the engines take over")
+    parser.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES)
+    parser.add_argument("--output", help="write every game and the summary as JSON")
+    args = parser.parse_args()
+
+    try:
+        engine_a = parse_engine(args.engine_a, "a")
+        engine_b = parse_engine(args.engine_b, "b")
+    except ValueError as e:
+        parser.error(str(e))
+    start = time.perf_counter()
+    results = run_arena(engine_a, engine_b, args.games, args.workers, args.seed, args.opening_plies, args.max_plies)
+    summary = summarize(results, engine_a, engine_b)
+
+    print(f"{engine_a['name']} vs {engine_b['name']}: {len(results)} games in {time.perf_counter() - start:.1f}s")
+    print(f"  +{summary['wins']} ={summary['draws']} -{summary['losses']}  score {summary['score']:.3f}" + (f"  elo {summary['elo']:+.0f}" if summary["elo"] is not None else ""))
+    print(f"  endings: {summary['reasons']}")
+    for label, engine in summary["engines"].items():
+        nps = f"{engine['nodes_per_second']:.0f}" if engine["nodes_per_second"] is not None else "n/a"
+        print(f"  {label}: {engine['name']:<27} {engine['seconds_per_move'] or 0:.4f} s/move  {nps} nodes/s")
+
+    if args.output:
+        with open(args.output, "w") as arq:
+            json.dump({"games" : results, "summary" : summary}, arq, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import argparse, time
+import chess.botV2 as bot
+import chess.evaluation as evaluation
+from chess.chess_functions import *
+from benchmarks.parallel_search import load_positions, POSITIONS_PATH
+from benchmarks.quiescence_bench import random_positions
+
+# Leaf evaluation cost: every child of each position scored with count_points
+# (the old full-board count), with evaluate_board one board at a time, with
+# evaluate_move from the parent's score, and with evaluate_children in one
+# NumPy batch, as microseconds per leaf. Then whole searches without
+# quiescence with the material and tables evaluators.
+# Run from the backend folder:
+#   python -m benchmarks.eval_bench --random-positions 50 --depth 4
+
+
+def count_points_leaves(board, turn, moves):
+    other = Colour.BLACK if turn == Colour.WHITE else Colour.WHITE
+    scores = []
+    for move in moves:
+        child = list(board)
+        raw_move_piece(child, move)
+        scores.append(bot.count_points(child, turn) - bot.count_points(child, other))
+    return scores
+
+
+def table_leaves(board, turn, moves):
+    scores = []
+    for move in moves:
+        child = list(board)
+        raw_move_piece(child, move)
+        scores.append(evaluation.evaluate_board(child, turn))
+    return scores
+
+
+def move_leaves(board, turn, moves):
+    score = evaluation.evaluate_board(board, Colour.WHITE)
+    sign = 1 if turn == Colour.WHITE else -1
+    return [sign * evaluation.evaluate_move(board, score, move) for move in moves]
+
+
+EVALUATORS = [
+    ("count_points", count_points_leaves),
+    ("evaluate_board", table_leaves),
+    ("evaluate_move", move_leaves),
+    ("numpy batch", evaluation.evaluate_children),
+]
+
+
+def time_leaves(positions, evaluate, repeat):
+    leaves = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for position in positions:
+            leaves += len(evaluate(position["board"], position["turn"], position["children"]))
+    return (time.perf_counter() - start) / leaves * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-leaf evaluation cost")
+    parser.add_argument("--random-positions", type=int, default=20, help="random-play positions added to the stored ones")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--depth", type=int, default=3, help="depth of the search comparison, 0 to skip it")
+    parser.add_argument("--positions", default=POSITIONS_PATH)
+    args = parser.parse_args()
+    evaluation.require_numpy()
+
+    positions = load_positions(args.positions) + random_positions(args.random_positions, args.seed)
+    for position in positions:
+        position["children"] = bot.get_all_possible_moves(position)
+    positions = [position for position in positions if position["children"]]
+    siblings = sum(len(position["children"]) for position in positions) / len(positions)
+
+    print(f"{len(positions)} positions, {siblings:.1f} children each")
+    print(f"{'evaluator':<20}{'us/leaf':>10}")
+    for label, evaluate in EVALUATORS:
+        print(f"{label:<20}{time_leaves(positions, evaluate, args.repeat):>10.2f}")
+
+    if args.depth <= 0:
+        return
+    print(f"\nsearch at depth {args.depth} without quiescence")
+    print(f"{'evaluator':<20}{'nodes':>10}{'seconds':>10}{'nodes/s':>10}")
+    for evaluator in bot.EVALUATORS:
+        nodes = 0
+        seconds = 0
+        for position in positions:
+            start = time.perf_counter()
+            # the seed clears the table, so no scores leak between evaluators
+            result = bot.search_best_move(position, max_depth=args.depth, seed=args.seed, quiescence=False, use_book=False, evaluator=evaluator)
+            seconds += time.perf_counter() - start
+            nodes += result["nodes"]
+        print(f"{evaluator:<20}{nodes:>10}{seconds:>10.3f}{nodes / seconds:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
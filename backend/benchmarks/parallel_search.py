@@ -0,0 +1,53 @@
+import argparse, json, os, time
+import chess.botV2 as bot
+from chess.parallel import shutdown_pool
+
+# Serial vs parallel root search on the stored benchmark positions.
+# Run from the backend folder: python -m benchmarks.parallel_search --workers 4
+
+POSITIONS_PATH = os.path.join(os.path.dirname(__file__), "positions.json")
+
+
+def load_positions(path = POSITIONS_PATH):
+    with open(path, 'r') as arq:
+        positions = json.load(arq)
+    for position in positions:
+        position.setdefault("moves", [])
+    return positions
+
+
+def timed_search(game, depth, workers, seed):
+    start = time.perf_counter()
+    result = bot.search_best_move(game, max_depth=depth, seed=seed, workers=workers, use_book=False)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare serial and parallel botV2 root search")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--positions", default=POSITIONS_PATH)
+    args = parser.parse_args()
+
+    # one throwaway search so pool start-up is not charged to the first position
+    positions = load_positions(args.positions)
+    timed_search(positions[0], 1, args.workers, args.seed)
+
+    total_serial = 0
+    total_parallel = 0
+    print(f"{'position':<22}{'serial s':>10}{'parallel s':>12}{'speedup':>9}  same score")
+    for position in positions:
+        serial, serial_time = timed_search(position, args.depth, 1, args.seed)
+        parallel, parallel_time = timed_search(position, args.depth, args.workers, args.seed)
+        total_serial += serial_time
+        total_parallel += parallel_time
+        speedup = serial_time / parallel_time if parallel_time else float("inf")
+        print(f"{position['name']:<22}{serial_time:>10.3f}{parallel_time:>12.3f}{speedup:>9.2f}  {serial['score'] == parallel['score']}")
+
+    print(f"{'total':<22}{total_serial:>10.3f}{total_parallel:>12.3f}{total_serial / total_parallel:>9.2f}")
+    shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
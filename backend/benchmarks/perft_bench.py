@@ -0,0 +1,86 @@
+import argparse, json, os, subprocess, time
+from chess.perft import timed_perft, divide, prepare_perft_game
+from benchmarks.parallel_search import load_positions, POSITIONS_PATH
+
+# Move-generation benchmark: perft node counts, nodes/sec and per-depth
+# timings for the start position and the stored positions, saved as JSON.
+# Run from the backend folder:
+#   python -m benchmarks.perft_bench --depth 4 --output perft.json
+#   python -m benchmarks.perft_bench --depth 4 --compare perft.json
+
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous):
+    """
+    Prints node-count mismatches and the speed ratio against an earlier run.
+    Returns False when any node count differs.
+    """
+    ok = True
+    old_positions = {(p["name"], p["backend"]): p for p in previous["positions"]}
+    for position in results["positions"]:
+        old = old_positions.get((position["name"], position["backend"]))
+        if old is None:
+            continue
+        for record, old_record in zip(position["depths"], old["depths"]):
+            if record["nodes"] != old_record["nodes"]:
+                ok = False
+                print(f"MISMATCH {position['name']} [{position['backend']}] depth {record['depth']}: {record['nodes']} != {old_record['nodes']}")
+            elif record["seconds"] > 0 and old_record["seconds"] > 0:
+                ratio = old_record["seconds"] / record["seconds"]
+                print(f"{position['name']:<22}[{position['backend']}] depth {record['depth']}: {ratio:.2f}x vs {previous.get('commit')}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="perft move-generation benchmark")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--backend", action="append", choices=["list", "bitboard"],
+                        help="can be given more than once, defaults to every backend")
+    parser.add_argument("--positions", default=POSITIONS_PATH)
+    parser.add_argument("--only", help="run a single stored position by name")
+    parser.add_argument("--divide", action="store_true", help="print the node count under every root move")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file from an earlier run to check node counts and speed against")
+    args = parser.parse_args()
+
+    backends = args.backend or ["list", "bitboard"]
+    positions = load_positions(args.positions)
+    if args.only:
+        positions = [p for p in positions if p["name"] == args.only]
+
+    results = {
+        "commit" : current_commit(),
+        "timestamp" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "depth" : args.depth,
+        "positions" : [],
+    }
+    for position in positions:
+        for backend in backends:
+            records = timed_perft(position, args.depth, backend)
+            results["positions"].append({"name" : position["name"], "backend" : backend, "depths" : records})
+            for record in records:
+                nps = record["nodes_per_second"] or 0
+                print(f"{position['name']:<22}[{backend:<8}] depth {record['depth']}: {record['nodes']:>10} nodes {record['seconds']:>8.3f}s {nps:>12.0f} nodes/s")
+            if args.divide:
+                for move, nodes in sorted(divide(prepare_perft_game(position, backend), args.depth).items()):
+                    print(f"    {move}: {nodes}")
+
+    if args.output:
+        with open(args.output, "w") as arq:
+            json.dump(results, arq, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r') as arq:
+            previous = json.load(arq)
+        if not compare(results, previous):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
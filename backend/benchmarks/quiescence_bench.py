@@ -0,0 +1,88 @@
+import argparse, math, random, time
+import chess.botV2 as bot
+from chess.position import Position
+from chess.transposition import TranspositionTable
+from chess.chess_functions import new_game
+from benchmarks.parallel_search import load_positions, POSITIONS_PATH
+
+# Fixed-depth search against shallower searches with quiescence: node counts,
+# time, and move quality. Quality is how much worse the chosen move scores than
+# the best move in a deeper reference search (0 means as good as the best).
+# Run from the backend folder:
+#   python -m benchmarks.quiescence_bench --reference-depth 6 --random-positions 50
+
+# (label, max_depth, quiescence)
+CONFIGS = [
+    ("fixed depth 5", 5, False),
+    ("depth 3 + qsearch", 3, True),
+    ("depth 4 + qsearch", 4, True),
+]
+
+
+def random_positions(count, seed, min_plies = 10, max_plies = 40):
+    """
+    Positions reached by random play from the start, for a wider sample than
+    the stored ones. Games that run out of moves early are skipped.
+    """
+    rng = random.Random(seed)
+    start = new_game()
+    positions = []
+    while len(positions) < count:
+        position = Position(start["board"], start["turn"])
+        for ply in range(rng.randint(min_plies, max_plies)):
+            moves = position.generate_moves()
+            if not moves:
+                break
+            position.make_move_unchecked(*rng.choice(moves))
+        else:
+            positions.append({"name" : f"random_{len(positions)}", "board" : list(position.board), "turn" : position.turn, "moves" : []})
+    return positions
+
+
+def reference_scores(game, depth):
+    """
+    Exact scores of every root move at depth, with quiescence. The search is
+    run separately under each move with a full window, so none of them are
+    bounds.
+    """
+    position = bot.prepare_backend(game, "list")
+    context = bot.new_search_context(table=TranspositionTable())
+    scores = {}
+    for move in position.generate_moves():
+        position.make_move_unchecked(move[0], move[1])
+        scores[tuple(move)] = -bot.recursive_possible_moves(position, depth - 1, -math.inf, math.inf, 1, context)
+        position.unmake_move()
+    return scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fixed-depth search with quiescence search")
+    parser.add_argument("--reference-depth", type=int, default=5)
+    parser.add_argument("--random-positions", type=int, default=20, help="random-play positions added to the stored ones")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--positions", default=POSITIONS_PATH)
+    args = parser.parse_args()
+
+    positions = load_positions(args.positions) + random_positions(args.random_positions, args.seed)
+    references = [reference_scores(position, args.reference_depth) for position in positions]
+
+    print(f"{'search':<20}{'nodes':>10}{'seconds':>10}{'total loss':>12}{'best moves':>12}")
+    for label, depth, quiescence in CONFIGS:
+        nodes = 0
+        seconds = 0
+        loss = 0
+        best_moves = 0
+        for position, scores in zip(positions, references):
+            start = time.perf_counter()
+            # the seed clears the table, so no scores leak between configurations
+            result = bot.search_best_move(position, max_depth=depth, seed=args.seed, quiescence=quiescence, use_book=False)
+            seconds += time.perf_counter() - start
+            nodes += result["nodes"]
+            move_loss = max(scores.values()) - scores[tuple(result["move"])]
+            loss += move_loss
+            best_moves += move_loss == 0
+        print(f"{label:<20}{nodes:>10}{seconds:>10.3f}{loss:>12}{best_moves:>9}/{len(positions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import argparse, json, os, sys
+from concurrent.futures import wait, FIRST_COMPLETED
+from chess.chess_functions import *
+import chess.botV2 as botV2
+import chess.parallel as parallel
+
+# Batch analysis: positions stream in (a JSONL file, or the game files in the
+# boards directory), are searched on the shared worker pool of chess.parallel
+# and the results stream out as JSONL, one line per position. Only as many
+# positions as there are workers are in flight at any time, so memory stays
+# flat however long the input is, and a batch never takes over more of the
+# pool than it asked for. Every result carries its position's id, and a rerun skips the ids
+# already in the output file, so an interrupted batch picks up where it left off.
+# From the backend folder:
+#   python -m chess.analysis --input positions.jsonl --output analysis.jsonl --workers 4
+#   python -m chess.analysis --boards boards --all-plies --output analysis.jsonl
+
+DEFAULT_BATCH_DEPTH = botV2.DEFAULT_DEPTH
+
+
+def read_jsonl_positions(path):
+    """
+    Yields (id, game) from a JSONL file. Each line is a game dict with an
+    optional "id"; the line number is the id otherwise.
+    """
+    with open(path, 'r') as arq:
+        for line_number, line in enumerate(arq):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield str(record.get("id", line_number)), record
+
+
+def read_board_positions(boards_path = BOARDS_PATH):
+    """
+    Yields (matchname, game) for every stored game in boards_path.
+    """
+    for filename in sorted(os.listdir(boards_path)):
+        if filename.endswith(".json"):
+            with open(os.path.join(boards_path, filename), 'r') as arq:
+                yield filename[:-len(".json")], json.load(arq)
+
+
+def expand_plies(positions):
+    """
+    Replaces every game by the positions before each of its moves and the
+    final one, with ids like 'name:12'. Games are replayed from the start; a
+    move the replay rejects ends that game with an error entry for its ply.
+    """
+    for position_id, game in positions:
+        replay = new_game()
+        for ply, (move, _) in enumerate(game.get("moves", [])):
+            yield f"{position_id}:{ply}", {"board" : list(replay["board"]), "turn" : replay["turn"], "moves" : []}
+            try:
+                move_piece(replay, move)
+            except (ValueError, IndexError):
+                pass
+            if len(replay["moves"]) == ply:
+                yield f"{position_id}:{ply + 1}", {"error" : f"illegal move {get_move_notation(move)} at ply {ply}"}
+                break
+        else:
+            yield f"{position_id}:{len(game.get('moves', []))}", {"board" : replay["board"], "turn" : replay["turn"], "moves" : []}
+
+
+def analyze_position(position_id, game, options):
+    """
+    Searches one position; runs inside a worker process. options are
+    search_best_move keyword arguments.
+    """
+    if "error" in game:
+        return {"id" : position_id, "error" : game["error"]}
+    try:
+        result = botV2.search_best_move({"board" : game["board"], "turn" : game["turn"], "moves" : []}, **options)
+    except Exception as e:
+        return {"id" : position_id, "error" : str(e)}
+    move = result["move"]
+    return {
+        "id" : position_id,
+        "move" : get_move_notation(move) if move else None,
+        "score" : result["score"],
+        "depth" : result["depth"],
+        "nodes" : result["nodes"],
+        "elapsed" : result["elapsed"],
+        "book" : result.get("book", False),
+        "tablebase" : result.get("tablebase", False),
+        "distance" : result.get("distance"),
+    }
+
+
+def analyze_batch(positions, workers = 1, options = None, skip_ids = ()):
+    """
+    Yields one result per (id, game) in positions, in completion order.
+    Positions whose id is in skip_ids are not searched. With workers > 1 the
+    positions go to the shared chess.parallel pool, at most workers of them
+    (capped at its size) at a time.
+    """
+    options = options or {}
+    positions = ((position_id, game) for position_id, game in positions if position_id not in skip_ids)
+    if workers <= 1:
+        for position_id, game in positions:
+            yield analyze_position(position_id, game, options)
+        return
+
+    workers = parallel.clamp_workers(workers)
+    pool = parallel.get_pool()
+    pending = set()
+    try:
+        for position_id, game in positions:
+            pending.add(pool.submit(analyze_position, position_id, game, options))
+            if len(pending) >= workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        # also reached when the consumer stops early; the pool stays up
+        for future in pending:
+            future.cancel()
+
+
+def resume_output(output_path):
+    """
+    Ids already in an output file. A last line cut short by an interruption
+    is dropped from the file, so that position is searched again.
+    """
+    ids = set()
+    if not os.path.exists(output_path):
+        return ids
+    with open(output_path, 'rb+') as arq:
+        complete = 0
+        for line in arq:
+            if not line.endswith(b"\n"):
+                break
+            ids.add(json.loads(line)["id"])
+            complete += len(line)
+        arq.truncate(complete)
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse many positions with botV2")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="JSONL file with one game dict per line")
+    source.add_argument("--boards", nargs="?", const=BOARDS_PATH, help="directory of stored games (defaults to BOARDS_PATH)")
+    parser.add_argument("--output", help="JSONL results file; rerunning resumes it. Defaults to stdout")
+    parser.add_argument("--all-plies", action="store_true", help="analyse every position of each game instead of only its current one")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--depth", type=int, default=DEFAULT_BATCH_DEPTH)
+    parser.add_argument("--time-limit", type=float)
+    parser.add_argument("--node-limit", type=int)
+    parser.add_argument("--backend", choices=list(botV2.BACKENDS), default="list")
+    parser.add_argument("--book", action="store_true", help="answer book positions from the opening book")
+    parser.add_argument("--no-tablebase", action="store_true", help="search endgames the tablebase covers instead of probing it")
+    parser.add_argument("--restart", action="store_true", help="overwrite the output instead of resuming it")
+    args = parser.parse_args()
+
+    positions = read_jsonl_positions(args.input) if args.input else read_board_positions(args.boards)
+    if args.all_plies:
+        positions = expand_plies(positions)
+    options = {
+        "backend" : args.backend,
+        "max_depth" : args.depth,
+        "time_limit" : args.time_limit,
+        "node_limit" : args.node_limit,
+        "use_book" : args.book,
+        "use_tablebase" : not args.no_tablebase,
+    }
+
+    skip_ids = set()
+    if args.output and not args.restart:
+        skip_ids = resume_output(args.output)
+    out = open(args.output, "w" if args.restart else "a") if args.output else sys.stdout
+    count = 0
+    try:
+        for result in analyze_batch(positions, args.workers, options, skip_ids):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        parallel.shutdown_pool()
+    print(f"{count} positions analysed, {len(skip_ids)} already done", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import random
+from chess.chess_functions import *
+from chess.position import Position
+from chess.utils import ROOK_RAYS, BISHOP_RAYS, QUEEN_RAYS, KING_TARGETS, KNIGHT_TARGETS
+
+# Bitboard backend: alongside the usual 64-square board, the position carries
+# bitboards, a list of 64-bit ints indexed by the full piece code
+# (colour | piece). The two colour codes themselves (Colour.BLACK = 8 and
+# Colour.WHITE = 16) are not valid pieces, so those two slots hold the
+# occupancy mask of each side.
+# Move lists come out in exactly the same order as Position.generate_moves.
+
+BITBOARD_SLOTS = 32
+
+SQUARE_BITS = tuple(1 << i for i in range(64))
+
+
+def _ray_entries(rays):
+    entries = []
+    for ray in rays:
+        mask = 0
+        for sq in ray:
+            mask |= SQUARE_BITS[sq]
+        # a ray going up the board meets its nearest blocker at the lowest set bit
+        ascending = ray[-1] >= ray[0]
+        entries.append((ray, mask, ascending, {sq: i for i, sq in enumerate(ray)}))
+    return tuple(entries)
+
+ROOK_RAY_ENTRIES = tuple(_ray_entries(rays) for rays in ROOK_RAYS)
+BISHOP_RAY_ENTRIES = tuple(_ray_entries(rays) for rays in BISHOP_RAYS)
+QUEEN_RAY_ENTRIES = tuple(_ray_entries(rays) for rays in QUEEN_RAYS)
+
+
+def get_bitboards(board):
+    bitboards = [0] * BITBOARD_SLOTS
+    for sq, piece in enumerate(board):
+        if piece != EMPTY:
+            bit = SQUARE_BITS[sq]
+            bitboards[piece] |= bit
+            bitboards[piece & COLOUR_BITS] |= bit
+    return bitboards
+
+
+def iter_bits(bb):
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def get_slider_moves(ray_entries, own, occupancy):
+    moves = []
+    for ray, mask, ascending, index in ray_entries:
+        blockers = mask & occupancy
+        if not blockers:
+            moves.extend(ray)
+            continue
+        if ascending:
+            blocker = (blockers & -blockers).bit_length() - 1
+        else:
+            blocker = blockers.bit_length() - 1
+        moves.extend(ray[:index[blocker]])
+        if not own & SQUARE_BITS[blocker]:
+            moves.append(blocker)
+    return moves
+
+
+def get_piece_moves(board, bitboards, bit_pos):
+    full_piece = board[bit_pos]
+    colour = full_piece & COLOUR_BITS
+    own = bitboards[colour]
+    enemy = bitboards[colour ^ COLOUR_BITS]
+    occupancy = own | enemy
+
+    match full_piece & PIECE_BITS:
+        case Piece.PAWN:
+            if colour == Colour.WHITE:
+                if bit_pos >= 56:
+                    return []
+                up, left, right = bit_pos + 8, bit_pos + 7, bit_pos + 9
+            else:
+                if bit_pos < 8:
+                    return []
+                up, left, right = bit_pos - 8, bit_pos - 9, bit_pos - 7
+            moves = []
+            if not occupancy & SQUARE_BITS[up]:
+                moves.append(up)
+            col = bit_pos % 8
+            if col != 0 and enemy & SQUARE_BITS[left]:
+                moves.append(left)
+            if col != 7 and enemy & SQUARE_BITS[right]:
+                moves.append(right)
+            return moves
+        case Piece.ROOK:
+            return get_slider_moves(ROOK_RAY_ENTRIES[bit_pos], own, occupancy)
+        case Piece.BISHOP:
+            return get_slider_moves(BISHOP_RAY_ENTRIES[bit_pos], own, occupancy)
+        case Piece.QUEEN:
+            return get_slider_moves(QUEEN_RAY_ENTRIES[bit_pos], own, occupancy)
+        case Piece.KING:
+            return [i for i in KING_TARGETS[bit_pos] if not own & SQUARE_BITS[i]]
+        case Piece.KNIGHT:
+            return [i for i in KNIGHT_TARGETS[bit_pos] if not own & SQUARE_BITS[i]]
+    return []
+
+
+def get_slider_captures(ray_entries, enemy, occupancy):
+    captures = []
+    for ray, mask, ascending, index in ray_entries:
+        blockers = mask & occupancy
+        if not blockers:
+            continue
+        if ascending:
+            blocker = (blockers & -blockers).bit_length() - 1
+        else:
+            blocker = blockers.bit_length() - 1
+        if enemy & SQUARE_BITS[blocker]:
+            captures.append(blocker)
+    return captures
+
+
+def get_piece_captures(board, bitboards, bit_pos):
+    full_piece = board[bit_pos]
+    colour = full_piece & COLOUR_BITS
+    enemy = bitboards[colour ^ COLOUR_BITS]
+    occupancy = bitboards[colour] | enemy
+
+    match full_piece & PIECE_BITS:
+        case Piece.PAWN:
+            if colour == Colour.WHITE:
+                if bit_pos >= 56:
+                    return []
+                left, right = bit_pos + 7, bit_pos + 9
+            else:
+                if bit_pos < 8:
+                    return []
+                left, right = bit_pos - 9, bit_pos - 7
+            captures = []
+            col = bit_pos % 8
+            if col != 0 and enemy & SQUARE_BITS[left]:
+                captures.append(left)
+            if col != 7 and enemy & SQUARE_BITS[right]:
+                captures.append(right)
+            return captures
+        case Piece.ROOK:
+            return get_slider_captures(ROOK_RAY_ENTRIES[bit_pos], enemy, occupancy)
+        case Piece.BISHOP:
+            return get_slider_captures(BISHOP_RAY_ENTRIES[bit_pos], enemy, occupancy)
+        case Piece.QUEEN:
+            return get_slider_captures(QUEEN_RAY_ENTRIES[bit_pos], enemy, occupancy)
+        case Piece.KING:
+            return [i for i in KING_TARGETS[bit_pos] if enemy & SQUARE_BITS[i]]
+        case Piece.KNIGHT:
+            return [i for i in KNIGHT_TARGETS[bit_pos] if enemy & SQUARE_BITS[i]]
+    return []
+
+
+def _toggle(bitboards, piece, bits):
+    bitboards[piece] ^= bits
+    bitboards[piece & COLOUR_BITS] ^= bits
+
+
+class BitboardPosition(Position):
+    __slots__ = ("bitboards",)
+
+    def __init__(self, board, turn, undo_capacity = None):
+        if undo_capacity is None:
+            super().__init__(board, turn)
+        else:
+            super().__init__(board, turn, undo_capacity)
+        self.bitboards = get_bitboards(self.board)
+
+    def copy(self):
+        position = super().copy()
+        position.bitboards = list(self.bitboards)
+        return position
+
+    def make_move_unchecked(self, initial_pos, final_pos, flags = 0):
+        piece = self.board[initial_pos]
+        captured = self.board[final_pos]
+        super().make_move_unchecked(initial_pos, final_pos, flags)
+        self._apply(initial_pos, final_pos, piece, captured)
+
+    def _apply(self, initial_pos, final_pos, piece, captured):
+        # moves and unmoves are both plain XORs of the same squares
+        bitboards = self.bitboards
+        _toggle(bitboards, piece, SQUARE_BITS[initial_pos] | SQUARE_BITS[final_pos])
+        if captured != EMPTY:
+            _toggle(bitboards, captured, SQUARE_BITS[final_pos])
+
+    def unmake_move(self):
+        record = self.last_move()
+        if not super().unmake_move():
+            return False
+        self._apply(record[0], record[1], record[2], record[3])
+        return True
+
+    def piece_positions(self, turn):
+        return list(iter_bits(self.bitboards[turn]))
+
+    def count_pieces(self, piece):
+        return self.bitboards[piece].bit_count()
+
+    def generate_moves(self):
+        board = self.board
+        bitboards = self.bitboards
+        all_moves = []
+        for p in iter_bits(bitboards[self.turn]):
+            all_moves.extend([p, i] for i in get_piece_moves(board, bitboards, p))
+        return filter_legal_moves(board, self.turn, all_moves)
+
+    def generate_captures(self):
+        board = self.board
+        bitboards = self.bitboards
+        captures = []
+        for p in iter_bits(bitboards[self.turn]):
+            captures.extend([p, i] for i in get_piece_captures(board, bitboards, p))
+        return filter_legal_moves(board, self.turn, captures)
+
+
+if __name__ == "__main__":
+    # random playouts checking that both backends agree move for move
+    rng = random.Random(0)
+    start = new_game()
+    for game_number in range(50):
+        position = Position(start["board"], start["turn"])
+        bitboard_position = BitboardPosition(start["board"], start["turn"])
+        for ply in range(80):
+            list_moves = position.generate_moves()
+            bitboard_moves = bitboard_position.generate_moves()
+            if list_moves != bitboard_moves:
+                render_board(position.board)
+                raise AssertionError(f"game {game_number} ply {ply}: {list_moves} != {bitboard_moves}")
+            if position.generate_captures() != bitboard_position.generate_captures():
+                render_board(position.board)
+                raise AssertionError(f"game {game_number} ply {ply}: captures differ")
+            if not list_moves:
+                break
+            move = rng.choice(list_moves)
+            position.make_move(move)
+            bitboard_position.make_move(move)
+        while bitboard_position.unmake_move():
+            pass
+        if bitboard_position.bitboards != get_bitboards(start["board"]):
+            raise AssertionError(f"game {game_number}: bitboards out of sync after unmoving")
+    print("backends agree")
@@ -38,12 +38,13 @@ def get_all_possible_moves(game):
     turn = game["turn"]
     board = game["board"]
     
-    all_pieces_positions = piece_positions(board, turn)
+    # piece lists, when the game keeps them, spare the 64-square scan
+    all_pieces_positions = game["pieces"][turn] if "pieces" in game else piece_positions(board, turn)
     all_moves = []
     for p in all_pieces_positions:
         all_moves.extend([p, i] for i in get_piece_moves(board, p))
     
-    return all_moves
+    return filter_legal_moves(board, turn, all_moves)
     
 def recursive_possible_moves(game, move, main_turn = Colour.WHITE,fund = 2):
     if fund <= 0:
@@ -51,6 +52,13 @@ def recursive_possible_moves(game, move, main_turn = Colour.WHITE,fund = 2):
     move_piece(game, move)
     current_turn = game["turn"]
     allie = get_all_possible_moves(game)
+    if not allie:
+        # checkmate or stalemate
+        mated = is_in_check(game["board"], current_turn)
+        unmove_piece(game)
+        if not mated:
+            return 0
+        return -MATE_SCORE if current_turn == main_turn else MATE_SCORE
     total = []
     for move in allie:
         total.append(recursive_possible_moves(game, move, main_turn=main_turn, fund=fund-1))
@@ -58,6 +66,8 @@ def recursive_possible_moves(game, move, main_turn = Colour.WHITE,fund = 2):
     return max(total) if current_turn == main_turn else min(total)
 
 def get_bot_move(game, main_turn):
+    # search a copy that tracks piece lists, so the caller's game is never touched
+    game = {"board" : list(game["board"]), "turn" : game["turn"], "moves" : list(game["moves"]), "pieces" : get_piece_lists(game["board"])}
     allie = get_all_possible_moves(game)
     # print(allie)
     tot = []
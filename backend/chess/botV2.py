@@ -1,14 +1,11 @@
 import copy, time, os, random, math
 from chess.chess_functions import *
-ALL_PIECES = [Piece.BISHOP, Piece.KING, Piece.KNIGHT, Piece.PAWN, Piece.QUEEN, Piece.ROOK]
-PIECES_POINTS = {
-    Piece.BISHOP : 4,
-    Piece.KING : 10, 
-    Piece.KNIGHT : 3, 
-    Piece.PAWN : 1, 
-    Piece.QUEEN : 6, 
-    Piece.ROOK : 5
-}
+from chess.position import Position
+from chess.bitboard import BitboardPosition
+from chess.opening_book import probe_book
+from chess.tablebase import probe_tablebase
+from chess.transposition import TablePool, EXACT, LOWER, UPPER
+import chess.evaluation as evaluation
 
 def max_indices(arr):
     if not arr:
@@ -37,64 +34,491 @@ def get_all_possible_moves(game):
     turn = game["turn"]
     board = game["board"]
     
-    all_pieces_positions = piece_positions(board, turn)
+    # piece lists, when the game keeps them, spare the 64-square scan
+    all_pieces_positions = game["pieces"][turn] if "pieces" in game else piece_positions(board, turn)
     all_moves = []
     for p in all_pieces_positions:
         all_moves.extend([p, i] for i in get_piece_moves(board, p))
     
-    return all_moves
-    
-def recursive_possible_moves(game, move, worst_main, worst_opp, main_turn = Colour.WHITE,fund = 2):
-    other_turn = Colour.BLACK if Colour.WHITE == main_turn else Colour.WHITE
+    return filter_legal_moves(board, turn, all_moves)
 
-    move_piece(game, move)
-    
-    score = count_points(game["board"], main_turn) - count_points(game["board"], other_turn)
+# position class the search runs on, for each board representation
+BACKENDS = {
+    "list" : Position,
+    "bitboard" : BitboardPosition,
+}
 
-    remaining_depth = fund - 1
-    if remaining_depth <= 0:
-        unmove_piece(game)
-        return score
+# every search borrows a table of its own (see TablePool)
+TRANSPOSITION_TABLES = TablePool()
 
-    current_turn = game["turn"]
-    moves = get_all_possible_moves(game)
-    if not moves:
-        unmove_piece(game)
-        return score
-
-    if current_turn == main_turn:
-        value = -math.inf
-        for child_move in moves:
-            child_value = recursive_possible_moves(game, child_move, max(worst_main, value), worst_opp, main_turn=main_turn, fund=remaining_depth)
-            value = max(value, child_value)
-            worst_main = max(worst_main, value)
-            if worst_main >= worst_opp:
-                break
-        unmove_piece(game)
-        return value
+def table_kind(quiescence, evaluator = "material"):
+    # scores with and without quiescence, or from different evaluators, are
+    # on different scales, so they never share a table
+    return ("quiescence" if quiescence else "fixed depth", evaluator)
+
+# leaf evaluators: "material" counts material incrementally; "tables" adds
+# piece-square tables (see chess.evaluation) and, without quiescence, scores
+# the last ply from the squares each move changes
+EVALUATORS = ("material", "tables")
+
+# quiescence search settles the leaves, so depth 4 plays at least as well
+# as the old fixed depth 5 at about half the nodes (benchmarks.quiescence_bench)
+DEFAULT_DEPTH = 4
+MAX_PLY = 64
+# every mate the search finds scores within MAX_PLY of MATE_SCORE
+MATE_THRESHOLD = MATE_SCORE - MAX_PLY
+# how many nodes pass between clock reads when a time limit is set
+TIME_CHECK_INTERVAL = 256
+
+def prepare_backend(game, backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend {backend}")
+    # search on a private copy of the position, so neither the search state
+    # nor a half-searched board is ever visible in the live game
+    return BACKENDS[backend](game["board"], game["turn"])
+
+def other_colour(turn):
+    return Colour.BLACK if turn == Colour.WHITE else Colour.WHITE
+
+def score_to_table(value, ply):
+    # mate scores count plies from the root; the table keeps them counted
+    # from the node, so an entry means the same at any ply and in any search
+    if value >= MATE_THRESHOLD:
+        return value + ply
+    if value <= -MATE_THRESHOLD:
+        return value - ply
+    return value
+
+def score_from_table(value, ply):
+    if value >= MATE_THRESHOLD:
+        return value - ply
+    if value <= -MATE_THRESHOLD:
+        return value + ply
+    return value
+
+def probe_transposition(table, key, depth, alpha, beta, ply):
+    """
+    Returns (value, best_move). value is None unless the stored entry is deep
+    enough and its bound settles the node inside the current window.
+    """
+    entry = table.probe(key)
+    if entry is None:
+        return None, None
+    _, entry_depth, value, bound, best_move, _ = entry
+    value = score_from_table(value, ply)
+    if entry_depth >= depth:
+        if bound == EXACT or (bound == LOWER and value >= beta) or (bound == UPPER and value <= alpha):
+            return value, best_move
+    return None, best_move
+
+def store_transposition(table, key, depth, value, alpha, beta, best_move, ply):
+    if value <= alpha:
+        bound = UPPER
+    elif value >= beta:
+        bound = LOWER
     else:
-        value = math.inf
-        for child_move in moves:
-            child_value = recursive_possible_moves(game, child_move, worst_main, min(worst_opp, value), main_turn=main_turn, fund=remaining_depth)
-            value = min(value, child_value)
-            worst_opp = min(worst_opp, value)
-            if worst_main >= worst_opp:
-                break
-        unmove_piece(game)
-        return value
-
-def get_bot_move(game):
-    main_turn = game["turn"]
-    allie = get_all_possible_moves(game)
+        bound = EXACT
+    table.store(key, depth, score_to_table(value, ply), bound, best_move)
+
+class SearchTimeout(Exception):
+    pass
+
+def new_search_stats():
+    return {
+        "leaf_evaluations" : 0,
+        "beta_cutoffs" : 0,
+        "first_move_cutoffs" : 0,
+        "tt_hits" : 0,
+        "quiescence_nodes" : 0,
+        "max_ply" : 0,
+        "root_moves" : [],
+    }
+
+def finish_search_stats(stats, nodes, elapsed):
+    stats["nodes"] = nodes
+    stats["elapsed"] = elapsed
+    stats["nodes_per_second"] = nodes / elapsed if elapsed > 0 else None
+    stats["first_move_cutoff_rate"] = stats["first_move_cutoffs"] / stats["beta_cutoffs"] if stats["beta_cutoffs"] else None
+    return stats
+
+def new_ordering():
+    # killer moves per ply and history scores per (from, to) square pair
+    return {
+        "killers" : [[None, None] for ply in range(MAX_PLY)],
+        "history" : [[0] * 64 for sq in range(64)],
+    }
+
+def new_search_context(time_limit = None, node_limit = None, collect_stats = False, stop_event = None, quiescence = True, evaluator = "material", table = None, ordering = None):
+    """
+    Per-search bookkeeping shared by every node: the node count, the budget,
+    the transposition table the search owns, the killer/history tables used
+    for move ordering (ordering, from new_ordering, when they should outlive
+    the search), whether leaves are resolved with a quiescence search, and
+    how they are evaluated.
+    Limits are only enforced once can_stop is set, after the first iteration.
+    Setting stop_event (a threading.Event) cancels the search at any point.
+    stats stays None unless collect_stats is set, and every counter in the
+    search sits behind that one check.
+    """
+    if ordering is None:
+        ordering = new_ordering()
+    return {
+        "stop_event" : stop_event,
+        "table" : table,
+        "stats" : new_search_stats() if collect_stats else None,
+        "nodes" : 0,
+        "start" : time.perf_counter(),
+        "deadline" : None if time_limit is None else time.perf_counter() + time_limit,
+        "node_limit" : node_limit,
+        "can_stop" : False,
+        "killers" : ordering["killers"],
+        "history" : ordering["history"],
+        "quiescence" : quiescence,
+        "table_evaluation" : evaluator == "tables",
+        "delta_margin" : evaluation.MAX_BONUS_GAIN if evaluator == "tables" else 0,
+        "score_last_ply" : evaluator == "tables" and not quiescence,
+    }
+
+def check_depth(max_depth):
+    # the killer table has one row per ply, and depth 0 would search nothing
+    if not 1 <= max_depth < MAX_PLY:
+        raise ValueError(f"max_depth must be between 1 and {MAX_PLY - 1}")
+
+def check_evaluator(evaluator):
+    if evaluator not in EVALUATORS:
+        raise ValueError(f"unknown evaluator {evaluator}")
+
+def evaluate(position, context):
+    if context["table_evaluation"]:
+        return evaluation.evaluate_board(position.board, position.turn)
+    return position.evaluate()
+
+def check_budget(context):
+    nodes = context["nodes"] = context["nodes"] + 1
+    if nodes % TIME_CHECK_INTERVAL == 0:
+        if context["stop_event"] is not None and context["stop_event"].is_set():
+            raise SearchTimeout()
+        if context["can_stop"] and context["deadline"] is not None and time.perf_counter() >= context["deadline"]:
+            raise SearchTimeout()
+    if context["can_stop"] and context["node_limit"] is not None and nodes >= context["node_limit"]:
+        raise SearchTimeout()
+
+# ------------------------------------------------------------------------------------------ #
+# ----------------------------------- MOVE ORDERING ---------------------------------------- #
+# ------------------------------------------------------------------------------------------ #
+
+HASH_MOVE_SCORE = 1_000_000
+CAPTURE_SCORE = 100_000
+KILLER_SCORES = (90_000, 80_000)
+
+def order_moves(board, moves, hash_move, killers, history):
+    """
+    Hash move first, then captures by MVV-LVA (most valuable victim, least
+    valuable attacker), then killer moves, then quiet moves by history score.
+    """
+    def move_score(move):
+        if move == hash_move:
+            return HASH_MOVE_SCORE
+        victim = board[move[1]]
+        if victim != EMPTY:
+            attacker = board[move[0]]
+            return CAPTURE_SCORE + 10 * POINTS_BY_TYPE[victim & PIECE_BITS] - POINTS_BY_TYPE[attacker & PIECE_BITS]
+        if move == killers[0]:
+            return KILLER_SCORES[0]
+        if move == killers[1]:
+            return KILLER_SCORES[1]
+        return history[move[0]][move[1]]
+
+    moves.sort(key=move_score, reverse=True)
+    return moves
+
+def order_captures(board, captures):
+    # MVV-LVA only; quiescence has no hash moves, killers or history
+    captures.sort(key=lambda move: 10 * POINTS_BY_TYPE[board[move[1]] & PIECE_BITS] - POINTS_BY_TYPE[board[move[0]] & PIECE_BITS], reverse=True)
+    return captures
+
+def record_cutoff(board, move, depth, ply, context):
+    # only quiet moves become killers; captures are already ordered first
+    if board[move[1]] != EMPTY:
+        return
+    killers = context["killers"][ply]
+    if move != killers[0]:
+        killers[1] = killers[0]
+        killers[0] = move
+    context["history"][move[0]][move[1]] += depth * depth
+
+# ------------------------------------------------------------------------------------------ #
+# -------------------------------------- SEARCH -------------------------------------------- #
+# ------------------------------------------------------------------------------------------ #
+
+def quiescence(position, alpha, beta, ply, context):
+    """
+    Captures-only search at the horizon, so a leaf is never scored in the
+    middle of an exchange. The side to move may always stand pat on the
+    current material instead of capturing, unless it is in check: then every
+    evasion is searched, and having none is checkmate.
+    """
+    check_budget(context)
+    stats = context["stats"]
+    if stats is not None:
+        stats["quiescence_nodes"] += 1
+        stats["leaf_evaluations"] += 1
+        if ply > stats["max_ply"]:
+            stats["max_ply"] = ply
+
+    # evasions can give check back, so bound the line
+    if ply < MAX_PLY and position.in_check():
+        return quiescence_evasions(position, alpha, beta, ply, context)
+
+    stand_pat = evaluate(position, context)
+    if stand_pat >= beta:
+        return stand_pat
+    if stand_pat > alpha:
+        alpha = stand_pat
+
+    board = position.board
+    captures = position.generate_captures()
+    order_captures(board, captures)
+
+    value = stand_pat
+    for capture in captures:
+        # delta pruning: the opponent can stand pat straight after, so a
+        # capture never scores more than the victim's value (plus whatever
+        # square bonuses the evaluator adds) over stand-pat. Captures are
+        # sorted by victim, so every later one falls short too.
+        if stand_pat + POINTS_BY_TYPE[board[capture[1]] & PIECE_BITS] + context["delta_margin"] <= alpha:
+            break
+        position.make_move_unchecked(capture[0], capture[1])
+        child_value = -quiescence(position, -beta, -alpha, ply + 1, context)
+        position.unmake_move()
+        if child_value > value:
+            value = child_value
+        if value > alpha:
+            alpha = value
+        if alpha >= beta:
+            break
+    return value
+
+def quiescence_evasions(position, alpha, beta, ply, context):
+    evasions = position.generate_moves()
+    if not evasions:
+        return -MATE_SCORE + ply
+    order_captures(position.board, evasions)
+    value = -math.inf
+    for evasion in evasions:
+        position.make_move_unchecked(evasion[0], evasion[1])
+        child_value = -quiescence(position, -beta, -alpha, ply + 1, context)
+        position.unmake_move()
+        if child_value > value:
+            value = child_value
+        if value > alpha:
+            alpha = value
+        if alpha >= beta:
+            break
+    return value
+
+def terminal_score(position, ply):
+    # no legal moves: mated (sooner is worse) or stalemate
+    return -MATE_SCORE + ply if position.in_check() else 0
+
+def recursive_possible_moves(position, depth, alpha, beta, ply, context):
+    """
+    Negamax with alpha-beta: returns the score of the current position from the
+    point of view of the side to move, searching depth more plies.
+    """
+    check_budget(context)
+    stats = context["stats"]
+    if stats is not None and ply > stats["max_ply"]:
+        stats["max_ply"] = ply
+
+    if depth <= 0:
+        if context["quiescence"]:
+            return quiescence(position, alpha, beta, ply, context)
+        if stats is not None:
+            stats["leaf_evaluations"] += 1
+        return evaluate(position, context)
+
+    key = position.hash
+    tt_value, tt_move = probe_transposition(context["table"], key, depth, alpha, beta, ply)
+    if tt_value is not None:
+        if stats is not None:
+            stats["tt_hits"] += 1
+        return tt_value
+
+    moves = position.generate_moves()
+    if not moves:
+        if stats is not None:
+            stats["leaf_evaluations"] += 1
+        return terminal_score(position, ply)
+
+    board = position.board
+    order_moves(board, moves, tt_move, context["killers"][ply], context["history"])
+
+    # one ply from the horizon without quiescence every child is a leaf:
+    # score each from this board's table score and the squares its move
+    # changes, without making it, and cut off as usual
+    leaf_base = None
+    if depth == 1 and context["score_last_ply"]:
+        leaf_base = evaluation.evaluate_board(board, Colour.WHITE)
+        leaf_sign = 1 if position.turn == Colour.WHITE else -1
+
+    original_alpha = alpha
+    value = -math.inf
+    best_move = None
+    for index, child_move in enumerate(moves):
+        if leaf_base is not None:
+            context["nodes"] += 1
+            if stats is not None:
+                stats["leaf_evaluations"] += 1
+            child_value = leaf_sign * evaluation.evaluate_move(board, leaf_base, child_move)
+        else:
+            position.make_move_unchecked(child_move[0], child_move[1])
+            child_value = -recursive_possible_moves(position, depth - 1, -beta, -alpha, ply + 1, context)
+            position.unmake_move()
+        if child_value > value:
+            value = child_value
+            best_move = child_move
+        if value > alpha:
+            alpha = value
+        if alpha >= beta:
+            record_cutoff(board, child_move, depth, ply, context)
+            if stats is not None:
+                stats["beta_cutoffs"] += 1
+                if index == 0:
+                    stats["first_move_cutoffs"] += 1
+            break
+
+    store_transposition(context["table"], key, depth, value, original_alpha, beta, best_move, ply)
+    return value
+
+def search_root(position, depth, allie, context):
+    """
+    Searches every root move with a window carried over from the earlier ones.
+    The lower edge sits one point below the best score so far, so moves that
+    tie with the best still get an exact score and can be picked at random.
+    """
+    stats = context["stats"]
+    root_moves = []
     tot = []
+    best = -math.inf
     for m in allie:
-        worst_main = -math.inf
-        worst_opp = math.inf
-        move_points = recursive_possible_moves(game, m, worst_main, worst_opp, main_turn=main_turn, fund=5)
+        alpha = best - 1
+        if stats is not None:
+            move_start = time.perf_counter()
+            nodes_before = context["nodes"]
+        position.make_move_unchecked(m[0], m[1])
+        move_points = -recursive_possible_moves(position, depth - 1, -math.inf, -alpha, 1, context)
+        position.unmake_move()
+        if stats is not None:
+            root_moves.append({
+                "move" : get_move_notation(m),
+                "score" : move_points,
+                "nodes" : context["nodes"] - nodes_before,
+                "seconds" : time.perf_counter() - move_start,
+            })
         tot.append(move_points)
+        best = max(best, move_points)
+    if stats is not None:
+        # only a finished iteration replaces the per-move timings
+        stats["root_moves"] = root_moves
+    return tot
+
+def iterative_deepening(position, max_depth, context, root_moves = None):
+    """
+    Searches depth 1, 2, 3... up to max_depth, yielding (depth, moves, scores)
+    for every iteration that finishes. Stops quietly when the context's budget
+    runs out; depth 1 always finishes. root_moves restricts the search to
+    some of the root moves.
+    """
+    allie = position.generate_moves() if root_moves is None else [list(m) for m in root_moves]
+    plies_before = position.ply
+    previous_best = None
+    for depth in range(1, max_depth + 1):
+        if not allie:
+            return
+        order_moves(position.board, allie, previous_best, context["killers"][0], context["history"])
+        try:
+            tot = search_root(position, depth, allie, context)
+        except SearchTimeout:
+            # unwind whatever the aborted iteration left on the board
+            while position.ply > plies_before:
+                position.unmake_move()
+            return
+        yield depth, list(allie), tot
+        previous_best = allie[tot.index(max(tot))]
+        context["can_stop"] = True
+
+def pick_move(allie, tot, depth, rng = random):
     maximuns = max_indices(tot)
-    move_index = random.choice(maximuns)
-    return allie[move_index]
+    move_index = rng.choice(maximuns)
+    return {"move" : allie[move_index], "score" : tot[move_index], "depth" : depth}
+
+def search_best_move(game, backend = "list", max_depth = DEFAULT_DEPTH, time_limit = None, node_limit = None, seed = None, workers = 1, collect_stats = False, on_iteration = None, stop_event = None, quiescence = True, use_book = True, evaluator = "material", use_tablebase = True, ordering = None):
+    """
+    Iterative deepening: stops early once time_limit (seconds) or node_limit
+    is used up, and the move comes from the deepest iteration that finished.
+    The search borrows a transposition table no other search is using.
+    With a seed that table is cleared first and ties are broken with
+    random.Random(seed), so fixed-depth or node-limited searches repeat exactly.
+    workers > 1 splits the root moves over a process pool (see chess.parallel).
+    collect_stats adds result["stats"] with node, cutoff and table counters.
+    on_iteration(result) is called after every finished iteration, and setting
+    stop_event cancels the search (the move is None if depth 1 never finished).
+    Both only work in the serial search; passing either with workers > 1
+    raises ValueError. ordering (see new_ordering) hands the serial search
+    killer and history tables filled by an earlier search of the same root,
+    which it keeps updating.
+    quiescence extends every leaf with a captures-only search, and evaluator
+    is "material" or "tables" (see EVALUATORS). Searches with different
+    settings of either borrow their tables from separate sets (see table_kind),
+    so their scores never mix.
+    With use_book, a position in the opening book is answered from the book
+    without searching; the result then has book set and depth 0.
+    With use_tablebase, a position the endgame tablebase covers is answered
+    exactly from it (result["tablebase"] set, "distance" the plies to mate,
+    see chess.tablebase).
+    """
+    check_depth(max_depth)
+    check_evaluator(evaluator)
+    if workers > 1 and (on_iteration is not None or stop_event is not None):
+        raise ValueError("on_iteration and stop_event need a serial search")
+    rng = random if seed is None else random.Random(seed)
+    if use_book:
+        start = time.perf_counter()
+        book_move = probe_book(game, rng)
+        if book_move is not None:
+            return {"move" : book_move, "score" : None, "depth" : 0, "book" : True, "nodes" : 0, "elapsed" : time.perf_counter() - start}
+    if use_tablebase:
+        start = time.perf_counter()
+        hit = probe_tablebase(game, rng)
+        if hit is not None:
+            return {"move" : hit[0], "score" : None, "depth" : 0, "tablebase" : True, "distance" : hit[1], "nodes" : 0, "elapsed" : time.perf_counter() - start}
+
+    if workers > 1:
+        from chess.parallel import search_best_move_parallel
+        return search_best_move_parallel(game, workers, backend, max_depth, time_limit, node_limit, seed, collect_stats, quiescence, evaluator)
+
+    position = prepare_backend(game, backend)
+    result = {"move" : None, "score" : None, "depth" : 0}
+    with TRANSPOSITION_TABLES.borrow(table_kind(quiescence, evaluator)) as table:
+        if seed is not None:
+            table.clear()
+        table.new_search()
+        context = new_search_context(time_limit, node_limit, collect_stats, stop_event, quiescence, evaluator, table, ordering)
+        for depth, allie, tot in iterative_deepening(position, max_depth, context):
+            result = pick_move(allie, tot, depth, rng)
+            if on_iteration is not None:
+                on_iteration(dict(result, nodes=context["nodes"], elapsed=time.perf_counter() - context["start"]))
+
+    result["nodes"] = context["nodes"]
+    result["elapsed"] = time.perf_counter() - context["start"]
+    if collect_stats:
+        result["stats"] = finish_search_stats(context["stats"], result["nodes"], result["elapsed"])
+        result["stats"]["depth"] = result["depth"]
+    return result
+
+def get_bot_move(game, backend = "list", max_depth = DEFAULT_DEPTH, time_limit = None, node_limit = None, seed = None, workers = 1, use_book = True, use_tablebase = True):
+    return search_best_move(game, backend, max_depth, time_limit, node_limit, seed, workers, use_book=use_book, use_tablebase=use_tablebase)["move"]
 
 
 
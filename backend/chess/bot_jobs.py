@@ -0,0 +1,119 @@
+import threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Bot moves as background jobs. A job runs on a small, fixed executor, so a
+# long search never holds a web worker. It publishes updates (one per
+# finished iterative-deepening iteration, then the final result) that clients
+# can poll or stream, and it can be cancelled through its stop event.
+
+DEFAULT_JOB_WORKERS = 2
+# finished jobs are forgotten after this many seconds
+JOB_TTL = 300
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+FINISHED_STATES = (DONE, CANCELLED, FAILED)
+
+
+class BotJob:
+
+    def __init__(self, matchname):
+        self.id = uuid.uuid4().hex
+        self.matchname = matchname
+        self.status = QUEUED
+        self.updates = []
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.stop_event = threading.Event()
+        self._changed = threading.Condition()
+
+    def publish(self, update):
+        with self._changed:
+            self.updates.append(update)
+            self._changed.notify_all()
+
+    def finish(self, status, result = None, error = None):
+        with self._changed:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished = time.time()
+            self._changed.notify_all()
+
+    def cancel(self):
+        self.stop_event.set()
+
+    def wait_for_update(self, seen, timeout = None):
+        """
+        Blocks until there are more than seen updates or the job finishes.
+        Returns the new updates.
+        """
+        with self._changed:
+            if len(self.updates) <= seen and self.status not in FINISHED_STATES:
+                self._changed.wait(timeout)
+            return self.updates[seen:]
+
+    def to_dict(self):
+        return {
+            "job_id" : self.id,
+            "matchname" : self.matchname,
+            "status" : self.status,
+            "latest" : self.updates[-1] if self.updates else None,
+            "updates" : len(self.updates),
+            "result" : self.result,
+            "error" : self.error,
+        }
+
+
+class BotJobManager:
+
+    def __init__(self, workers = DEFAULT_JOB_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bot-job")
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, matchname, run):
+        """
+        run(job) does the work and returns the job's result; it should pass
+        job.stop_event and job.publish on to the search.
+        """
+        job = BotJob(matchname)
+        with self._lock:
+            self._forget_old_jobs()
+            self.jobs[job.id] = job
+        self.executor.submit(self._run, job, run)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def _run(self, job, run):
+        if job.stop_event.is_set():
+            job.finish(CANCELLED)
+            return
+        job.status = RUNNING
+        try:
+            result = run(job)
+        except Exception as e:
+            print(e)
+            job.finish(FAILED, error=str(e))
+            return
+        job.finish(CANCELLED if job.stop_event.is_set() else DONE, result=result)
+
+    def _forget_old_jobs(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self.jobs.items() if job.finished is not None and now - job.finished > JOB_TTL]
+        for job_id in expired:
+            del self.jobs[job_id]
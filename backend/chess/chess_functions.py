@@ -1,8 +1,11 @@
 from enum import IntEnum
-from chess.utils import get_hv_rules
-import json, copy
+from chess.utils import ROOK_RAYS, BISHOP_RAYS, QUEEN_RAYS, KING_TARGETS, KNIGHT_TARGETS
+import json, copy, os
+from bisect import bisect_left, insort
 
-BOARDS_PATH = "/Users/tiagocastroorbite/Tiago/Python/2025-files/chess_botsie/backend/boards"
+BOARDS_PATH = os.environ.get("CHESS_BOARDS_PATH", os.path.join(os.path.dirname(__file__), "..", "boards"))
+# "json" keeps one file per match in BOARDS_PATH, "sqlite" uses chess.match_db
+STORAGE = os.environ.get("CHESS_STORAGE", "json")
 
 BOARD_SIZE = 64
 
@@ -50,16 +53,25 @@ class Colour(IntEnum):
     WHITE = 0b10000
 
 
+ALL_PIECES = [Piece.BISHOP, Piece.KING, Piece.KNIGHT, Piece.PAWN, Piece.QUEEN, Piece.ROOK]
+PIECES_POINTS = {
+    Piece.BISHOP : 4,
+    Piece.KING : 10, 
+    Piece.KNIGHT : 3, 
+    Piece.PAWN : 1, 
+    Piece.QUEEN : 6, 
+    Piece.ROOK : 5
+}
+# PIECES_POINTS indexed directly by piece & PIECE_BITS, for the hot paths
+POINTS_BY_TYPE = [0] * 8
+for _piece, _points in PIECES_POINTS.items():
+    POINTS_BY_TYPE[_piece] = _points
+
 TOP_ROW = [i for i in range(64-8, 64)]
 BOTTOM_ROW = [i for i in range(8)]
 LEFT_ROW = [i*8 for i in range(8)]
 RIGHT_ROW = [(i*8 + 7) for i in range(8)]
 
-KNIGHT_TOP_ROW = [i - 8 for i in TOP_ROW]
-KNIGHT_BOTTOM_ROW = [i + 8 for i in BOTTOM_ROW]
-KNIGHT_LEFT_ROW = [i + 1 for i in LEFT_ROW]
-KNIGHT_RIGHT_ROW = [i - 1 for i in RIGHT_ROW]
-
 
 # ------------------------------------------------------------------------------------------ #
 # --------------------------------- BOARD VISUALIZATION ------------------------------------ #
@@ -120,9 +132,12 @@ def render_board_with_marks(board, positions):
     render_board(b)
 
 def get_fancy_game(game):
-    game["turn"] = IDS_TO_COLOUR[game["turn"]]
-    game["board"] = get_fancy_board(game["board"])
-    return game
+    # a deep copy, so the response shares nothing with the live game and can
+    # be serialised after the match lock is released
+    fancy_game = copy.deepcopy(game)
+    fancy_game["turn"] = IDS_TO_COLOUR[game["turn"]]
+    fancy_game["board"] = get_fancy_board(game["board"])
+    return fancy_game
 
 
 
@@ -133,6 +148,9 @@ def get_fancy_game(game):
 
 
 def load_game(matchname = "default"):
+    if STORAGE == "sqlite":
+        import chess.match_db as match_db
+        return match_db.load_game(matchname)
     try:
         with open(f"{BOARDS_PATH}/{matchname}.json", 'r') as arq:
             game = json.load(arq)
@@ -142,7 +160,7 @@ def load_game(matchname = "default"):
     return game
 
 
-def create_game(matchname = "default"):
+def new_game():
     board = [EMPTY for i in range(64)]
     # White back rank (a1-h1)
     board[0:8] = [Colour.WHITE | Piece.ROOK, Colour.WHITE | Piece.KNIGHT, 
@@ -164,12 +182,22 @@ def create_game(matchname = "default"):
         "turn" : Colour.WHITE,
         "moves": []
     }
+    return game
 
+
+def create_game(matchname = "default"):
+    if STORAGE == "sqlite":
+        import chess.match_db as match_db
+        return match_db.create_game(matchname)
+    game = new_game()
     with open(f"{BOARDS_PATH}/{matchname}.json", "w") as mn:
         mn.write(json.dumps(game))
     return game
 
 def save_game(game, matchname = "default"):
+    if STORAGE == "sqlite":
+        import chess.match_db as match_db
+        return match_db.save_game(game, matchname)
     with open(f"{BOARDS_PATH}/{matchname}.json", "w") as mn:
         mn.write(json.dumps(game))
     return game
@@ -192,6 +220,20 @@ def get_position(string_pos):
     pos = letter + (number-1)*8
     return pos
 
+def get_coordinate(pos):
+    """
+    pos : 0 -> 'a1', already formatted coordinates pass through
+    """
+    if isinstance(pos, str):
+        return pos
+    return f"{'abcdefgh'[pos % 8]}{pos // 8 + 1}"
+
+def get_move_notation(move):
+    """
+    move : (12, 20) -> 'e2e3'
+    """
+    return f"{get_coordinate(move[0])}{get_coordinate(move[1])}"
+
 def raw_move_piece(board, move):
     """
     board : list,
@@ -238,93 +280,282 @@ def get_piece_moves(board, piece_position):
         case Piece.PAWN:
 
             if prime_piece_colour == Colour.WHITE:
-                last_row = TOP_ROW
+                if bit_pos >= 56:
+                    return []
                 tl_off = 7
                 tr_off = 9
                 up_off = 8
             else:
-                last_row = BOTTOM_ROW
+                if bit_pos < 8:
+                    return []
                 tl_off = -9
                 tr_off = -7
                 up_off = -8
 
-            if bit_pos in last_row:
-                return []
             top_square = bit_pos + up_off
             top_piece = board[top_square]
             if top_piece == EMPTY:
                 moves.append(top_square)
 
-            if bit_pos not in LEFT_ROW:
+            col = bit_pos % 8
+            if col != 0:
                 top_left = bit_pos + tl_off
                 tl_piece = board[top_left]
                 if tl_piece != EMPTY and (tl_piece & COLOUR_BITS) != prime_piece_colour:
                     moves.append(top_left)
 
-            if bit_pos not in RIGHT_ROW:
+            if col != 7:
                 top_right = bit_pos + tr_off
                 tr_piece = board[top_right]
                 if tr_piece != EMPTY and (tr_piece & COLOUR_BITS) != prime_piece_colour:
                     moves.append(top_right)
         
         case Piece.ROOK:
-            hor, vert, _ = get_hv_rules(bit_pos)
-            total_rules = [*hor, *vert]
-            moves = get_moves_by_rules(board, prime_piece_colour, total_rules)
+            moves = get_moves_by_rules(board, prime_piece_colour, ROOK_RAYS[bit_pos])
         
         case Piece.BISHOP:
-            _, _, diags = get_hv_rules(bit_pos)
-            moves = get_moves_by_rules(board, prime_piece_colour, diags)
+            moves = get_moves_by_rules(board, prime_piece_colour, BISHOP_RAYS[bit_pos])
         
         case Piece.QUEEN:
-            hor, vert, diags = get_hv_rules(bit_pos)
-            total_rules = [*hor, *vert, *diags]
-            moves = get_moves_by_rules(board, prime_piece_colour, total_rules)
+            moves = get_moves_by_rules(board, prime_piece_colour, QUEEN_RAYS[bit_pos])
         
         case Piece.KING:
-            hor, vert, diags = get_hv_rules(bit_pos, limit_range=True)
-            total_rules = [*hor, *vert, *diags]
-            moves = get_moves_by_rules(board, prime_piece_colour, total_rules)
+            moves = [i for i in KING_TARGETS[bit_pos] if (board[i] & COLOUR_BITS) != prime_piece_colour]
         
         case Piece.KNIGHT:
-            KNIGHT_OFFSETS = [15,17,6,10, -15,-17,-6,-10]
-
-            moves_to_remove = []
-
-            if bit_pos in TOP_ROW:
-                moves_to_remove.extend([15, 16, 6, 10])
-            elif bit_pos in KNIGHT_TOP_ROW:
-                moves_to_remove.extend([15, 16])
-            elif bit_pos in BOTTOM_ROW:
-                moves_to_remove.extend([-15, -16, -6, -10])
-            elif bit_pos in KNIGHT_BOTTOM_ROW:
-                moves_to_remove.extend([-15, -16])
-            
-            if bit_pos in LEFT_ROW:
-                moves_to_remove.extend([15, 6, -17, -10])
-            elif bit_pos in KNIGHT_LEFT_ROW:
-                moves_to_remove.extend([6, -10])
-            elif bit_pos in RIGHT_ROW:
-                moves_to_remove.extend([-15, -6, 17, 10])
-            elif bit_pos in KNIGHT_RIGHT_ROW:
-                moves_to_remove.extend([-6, 10])
-            
-            for mv in moves_to_remove:
-                if mv in KNIGHT_OFFSETS:
-                    KNIGHT_OFFSETS.remove(mv)
-            moves = []
-
-            for move in KNIGHT_OFFSETS:
-                move_pos = bit_pos + move
-                if move_pos < 0 or move_pos > 63:
-                    continue
-                piece_colour_in_pos = board[move_pos] & COLOUR_BITS
-                if piece_colour_in_pos == prime_piece_colour:
-                    continue
-                moves.append(move_pos)
+            moves = [i for i in KNIGHT_TARGETS[bit_pos] if (board[i] & COLOUR_BITS) != prime_piece_colour]
         
     return moves
 
+def get_captures_by_rules(board, colour, rules):
+    # only the first piece on each ray can be taken
+    _captures = []
+    for range_rule in rules:
+        for i in range_rule:
+            if board[i] != EMPTY:
+                if board[i] & COLOUR_BITS != colour:
+                    _captures.append(i)
+                break
+    return _captures
+
+def get_piece_captures(board, bit_pos):
+    """
+    The squares of get_piece_moves that hold an enemy piece, without
+    generating the quiet moves.
+    """
+    full_piece = board[bit_pos]
+    colour = full_piece & COLOUR_BITS
+    enemy = colour ^ COLOUR_BITS
+
+    match full_piece & PIECE_BITS:
+        case Piece.PAWN:
+            if colour == Colour.WHITE:
+                if bit_pos >= 56:
+                    return []
+                left, right = bit_pos + 7, bit_pos + 9
+            else:
+                if bit_pos < 8:
+                    return []
+                left, right = bit_pos - 9, bit_pos - 7
+            captures = []
+            col = bit_pos % 8
+            if col != 0 and board[left] & COLOUR_BITS == enemy:
+                captures.append(left)
+            if col != 7 and board[right] & COLOUR_BITS == enemy:
+                captures.append(right)
+            return captures
+        case Piece.ROOK:
+            return get_captures_by_rules(board, colour, ROOK_RAYS[bit_pos])
+        case Piece.BISHOP:
+            return get_captures_by_rules(board, colour, BISHOP_RAYS[bit_pos])
+        case Piece.QUEEN:
+            return get_captures_by_rules(board, colour, QUEEN_RAYS[bit_pos])
+        case Piece.KING:
+            return [i for i in KING_TARGETS[bit_pos] if board[i] & COLOUR_BITS == enemy]
+        case Piece.KNIGHT:
+            return [i for i in KNIGHT_TARGETS[bit_pos] if board[i] & COLOUR_BITS == enemy]
+    return []
+
+
+# ------------------------------------------------------------------------------------------ #
+# -------------------------------- ATTACKS AND LEGALITY ------------------------------------ #
+# ------------------------------------------------------------------------------------------ #
+
+# squares a pawn of each colour must stand on to attack a square
+PAWN_ATTACKERS = {
+    Colour.WHITE : tuple(tuple(p for p, ok in ((sq - 9, sq % 8 != 0), (sq - 7, sq % 8 != 7)) if ok and p >= 0) for sq in range(64)),
+    Colour.BLACK : tuple(tuple(p for p, ok in ((sq + 7, sq % 8 != 0), (sq + 9, sq % 8 != 7)) if ok and p < 64) for sq in range(64)),
+}
+
+# checkmate scores this much below zero for the side to move, less its ply
+MATE_SCORE = 1000
+
+def get_attackers(board, sq, colour):
+    """
+    Squares of colour's pieces that attack sq, whatever stands on sq.
+    """
+    attackers = [p for p in PAWN_ATTACKERS[colour][sq] if board[p] == colour | Piece.PAWN]
+    attackers.extend(p for p in KNIGHT_TARGETS[sq] if board[p] == colour | Piece.KNIGHT)
+    attackers.extend(p for p in KING_TARGETS[sq] if board[p] == colour | Piece.KING)
+    for rays, slider in ((ROOK_RAYS[sq], Piece.ROOK), (BISHOP_RAYS[sq], Piece.BISHOP)):
+        for ray in rays:
+            for p in ray:
+                piece = board[p]
+                if piece != EMPTY:
+                    if piece == colour | slider or piece == colour | Piece.QUEEN:
+                        attackers.append(p)
+                    break
+    return attackers
+
+def is_square_attacked(board, sq, colour):
+    for p in PAWN_ATTACKERS[colour][sq]:
+        if board[p] == colour | Piece.PAWN:
+            return True
+    knight = colour | Piece.KNIGHT
+    for p in KNIGHT_TARGETS[sq]:
+        if board[p] == knight:
+            return True
+    king = colour | Piece.KING
+    for p in KING_TARGETS[sq]:
+        if board[p] == king:
+            return True
+    queen = colour | Piece.QUEEN
+    for rays, slider in ((ROOK_RAYS[sq], colour | Piece.ROOK), (BISHOP_RAYS[sq], colour | Piece.BISHOP)):
+        for ray in rays:
+            for p in ray:
+                piece = board[p]
+                if piece != EMPTY:
+                    if piece == slider or piece == queen:
+                        return True
+                    break
+    return False
+
+def get_attack_map(board, colour):
+    """
+    How many of colour's pieces attack each of the 64 squares.
+    """
+    return [len(get_attackers(board, sq, colour)) for sq in range(64)]
+
+def find_king(board, colour):
+    king = colour | Piece.KING
+    return board.index(king) if king in board else None
+
+def is_in_check(board, colour):
+    king_sq = find_king(board, colour)
+    return king_sq is not None and is_square_attacked(board, king_sq, colour ^ COLOUR_BITS)
+
+def get_checks_and_pins(board, colour, king_sq):
+    """
+    (checkers, pins) for colour's king on king_sq. checkers maps each
+    checking piece to the squares that answer it: its own square, plus for a
+    slider the squares in between, nearest the king first. pins maps each
+    pinned piece to the squares it may still move to along the pin.
+    """
+    enemy = colour ^ COLOUR_BITS
+    checkers = {}
+    pins = {}
+    for p in PAWN_ATTACKERS[enemy][king_sq]:
+        if board[p] == enemy | Piece.PAWN:
+            checkers[p] = (p,)
+    for p in KNIGHT_TARGETS[king_sq]:
+        if board[p] == enemy | Piece.KNIGHT:
+            checkers[p] = (p,)
+    queen = enemy | Piece.QUEEN
+    for rays, slider in ((ROOK_RAYS[king_sq], enemy | Piece.ROOK), (BISHOP_RAYS[king_sq], enemy | Piece.BISHOP)):
+        for ray in rays:
+            pinned = None
+            for i, p in enumerate(ray):
+                piece = board[p]
+                if piece == EMPTY:
+                    continue
+                if piece & COLOUR_BITS == colour:
+                    if pinned is not None:
+                        break
+                    pinned = p
+                    continue
+                if piece == slider or piece == queen:
+                    if pinned is None:
+                        checkers[p] = ray[:i + 1]
+                    else:
+                        pins[pinned] = set(ray[:i + 1])
+                break
+    return checkers, pins
+
+def filter_legal_moves(board, colour, moves):
+    """
+    The moves of moves (pseudo-legal [from, to] pairs for colour, in any
+    order) that do not leave colour's king attacked, in the same order.
+    A board without colour's king has no illegal moves.
+    """
+    king_sq = find_king(board, colour)
+    if king_sq is None:
+        return moves
+    enemy = colour ^ COLOUR_BITS
+    checkers, pins = get_checks_and_pins(board, colour, king_sq)
+    answers = None
+    if len(checkers) == 1:
+        answers = set(next(iter(checkers.values())))
+    double_check = len(checkers) > 1
+    # a checking slider still covers the square behind the king
+    behind = set()
+    for checker, squares in checkers.items():
+        if board[checker] & PIECE_BITS in (Piece.ROOK, Piece.BISHOP, Piece.QUEEN):
+            away = 2 * king_sq - squares[0]
+            if away in KING_TARGETS[king_sq]:
+                behind.add(away)
+
+    legal = []
+    for move in moves:
+        initial_pos, final_pos = move[0], move[1]
+        if initial_pos == king_sq:
+            if final_pos not in behind and not is_square_attacked(board, final_pos, enemy):
+                legal.append(move)
+        elif double_check:
+            continue
+        elif answers is not None and final_pos not in answers:
+            continue
+        elif initial_pos in pins and final_pos not in pins[initial_pos]:
+            continue
+        else:
+            legal.append(move)
+    return legal
+
+def get_legal_moves(board, colour):
+    moves = []
+    for sq, piece in enumerate(board):
+        if piece != EMPTY and piece & COLOUR_BITS == colour:
+            moves.extend([sq, target] for target in get_piece_moves(board, sq))
+    return filter_legal_moves(board, colour, moves)
+
+def is_legal_move(board, colour, initial_pos, final_pos):
+    if board[initial_pos] & COLOUR_BITS != colour or final_pos not in get_piece_moves(board, initial_pos):
+        return False
+    return bool(filter_legal_moves(board, colour, [[initial_pos, final_pos]]))
+
+def get_game_status(board, colour):
+    """
+    "checkmate", "stalemate", "check" or "playing" for the side to move.
+    """
+    in_check = is_in_check(board, colour)
+    if get_legal_moves(board, colour):
+        return "check" if in_check else "playing"
+    return "checkmate" if in_check else "stalemate"
+
+
+def count_material(board):
+    material = {Colour.WHITE : 0, Colour.BLACK : 0}
+    for piece in board:
+        if piece != EMPTY:
+            material[piece & COLOUR_BITS] += POINTS_BY_TYPE[piece & PIECE_BITS]
+    return material
+
+def get_piece_lists(board):
+    # squares of each side's pieces, ascending
+    pieces = {Colour.WHITE : [], Colour.BLACK : []}
+    for sq, piece in enumerate(board):
+        if piece != EMPTY:
+            pieces[piece & COLOUR_BITS].append(sq)
+    return pieces
 
 def move_piece(game, move):
     board = game["board"]
@@ -342,8 +573,15 @@ def move_piece(game, move):
         input()
         return game
 
-    possible_moves = get_piece_moves(board, initial_pos)
-    if final_pos in possible_moves:
+    if is_legal_move(board, game["turn"], initial_pos, final_pos):
+        if "pieces" in game:
+            # kept ascending, like get_piece_lists builds them
+            if board[final_pos] != EMPTY:
+                captured = game["pieces"][board[final_pos] & COLOUR_BITS]
+                del captured[bisect_left(captured, final_pos)]
+            own = game["pieces"][piece_colour]
+            del own[bisect_left(own, initial_pos)]
+            insort(own, final_pos)
         game["moves"].append((move, (board[initial_pos], board[final_pos])))
         board = raw_move_piece(board, (initial_pos, final_pos))
         game["turn"] = Colour.BLACK if game["turn"] == Colour.WHITE else Colour.WHITE
@@ -355,8 +593,16 @@ def unmove_piece(game):
     lastmove = game["moves"][-1]
     unmove = (lastmove[1], lastmove[0])
     # game["board"] = raw_move_piece(game["board"], unmove)
-    game["board"][lastmove[0][0]] = lastmove[1][0]
-    game["board"][lastmove[0][1]] = lastmove[1][1]
+    initial_pos = get_position(lastmove[0][0]) if isinstance(lastmove[0][0], str) else lastmove[0][0]
+    final_pos = get_position(lastmove[0][1]) if isinstance(lastmove[0][1], str) else lastmove[0][1]
+    game["board"][initial_pos] = lastmove[1][0]
+    game["board"][final_pos] = lastmove[1][1]
+    if "pieces" in game:
+        own = game["pieces"][lastmove[1][0] & COLOUR_BITS]
+        del own[bisect_left(own, final_pos)]
+        insort(own, initial_pos)
+        if lastmove[1][1] != EMPTY:
+            insort(game["pieces"][lastmove[1][1] & COLOUR_BITS], final_pos)
     game["turn"] = Colour.BLACK if game["turn"] == Colour.WHITE else Colour.WHITE
     game["moves"].pop(-1)
     return game
@@ -0,0 +1,153 @@
+from chess.chess_functions import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Material plus piece-square tables. Every (piece code, square) pair has one
+# value, positive for white, so a board's score is the sum of its squares'
+# values. evaluate_board scores one board and evaluate_move the board after a
+# move, from the squares the move changes; this is what botV2's "tables"
+# evaluator uses. evaluate_batch scores a stack of boards, an (N, 64) uint8
+# array, in one NumPy pass, and evaluate_children builds that stack from a
+# position and its moves. The batch pays off when every board is wanted
+# (benchmarks.eval_bench), not in the search: alpha-beta usually stops after
+# a few children, and scoring those one move at a time is cheaper than
+# scoring them all. NumPy is optional and only needed for the batch functions.
+
+# Bonuses in sixteenths of a pawn, so sums of them stay exact in floats.
+# Rows from rank 1 to rank 8, from white's side; black uses them mirrored.
+PIECE_SQUARE_TABLES = {
+    Piece.PAWN : [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        0, 0, 0, -2, -2, 0, 0, 0,
+        0, 0, 1, 1, 1, 1, 0, 0,
+        0, 0, 1, 3, 3, 1, 0, 0,
+        1, 1, 2, 4, 4, 2, 1, 1,
+        2, 2, 3, 5, 5, 3, 2, 2,
+        6, 6, 6, 6, 6, 6, 6, 6,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ],
+    Piece.KNIGHT : [
+        -5, -4, -3, -3, -3, -3, -4, -5,
+        -4, -2, 0, 0, 0, 0, -2, -4,
+        -3, 0, 1, 2, 2, 1, 0, -3,
+        -3, 1, 2, 3, 3, 2, 1, -3,
+        -3, 0, 2, 3, 3, 2, 0, -3,
+        -3, 1, 1, 2, 2, 1, 1, -3,
+        -4, -2, 0, 1, 1, 0, -2, -4,
+        -5, -4, -3, -3, -3, -3, -4, -5,
+    ],
+    Piece.BISHOP : [
+        -2, -1, -1, -1, -1, -1, -1, -2,
+        -1, 1, 0, 0, 0, 0, 1, -1,
+        -1, 1, 1, 1, 1, 1, 1, -1,
+        -1, 0, 1, 1, 1, 1, 0, -1,
+        -1, 1, 1, 1, 1, 1, 1, -1,
+        -1, 0, 1, 1, 1, 1, 0, -1,
+        -1, 0, 0, 0, 0, 0, 0, -1,
+        -2, -1, -1, -1, -1, -1, -1, -2,
+    ],
+    Piece.ROOK : [
+        0, 0, 0, 1, 1, 0, 0, 0,
+        -1, 0, 0, 0, 0, 0, 0, -1,
+        -1, 0, 0, 0, 0, 0, 0, -1,
+        -1, 0, 0, 0, 0, 0, 0, -1,
+        -1, 0, 0, 0, 0, 0, 0, -1,
+        -1, 0, 0, 0, 0, 0, 0, -1,
+        1, 2, 2, 2, 2, 2, 2, 1,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ],
+    Piece.QUEEN : [
+        -2, -1, -1, 0, 0, -1, -1, -2,
+        -1, 0, 1, 0, 0, 0, 0, -1,
+        -1, 1, 1, 1, 1, 1, 0, -1,
+        0, 0, 1, 1, 1, 1, 0, 0,
+        0, 0, 1, 1, 1, 1, 0, 0,
+        -1, 0, 1, 1, 1, 1, 0, -1,
+        -1, 0, 0, 0, 0, 0, 0, -1,
+        -2, -1, -1, 0, 0, -1, -1, -2,
+    ],
+    Piece.KING : [
+        2, 3, 1, 0, 0, 1, 3, 2,
+        2, 2, 0, 0, 0, 0, 2, 2,
+        -1, -2, -2, -2, -2, -2, -2, -1,
+        -2, -3, -3, -4, -4, -3, -3, -2,
+        -3, -4, -4, -5, -5, -4, -4, -3,
+        -3, -4, -4, -5, -5, -4, -4, -3,
+        -3, -4, -4, -5, -5, -4, -4, -3,
+        -3, -4, -4, -5, -5, -4, -4, -3,
+    ],
+}
+TABLE_UNIT = 1 / 16
+PIECE_CODES = 64
+# the most a move changes the table bonuses, apart from the captured piece's
+# material: the mover's bonus rises by at most the widest table's spread, and
+# the captured piece's bonus, at most the largest one, goes with it
+MAX_BONUS_GAIN = (max(max(table) - min(table) for table in PIECE_SQUARE_TABLES.values()) + max(max(table) for table in PIECE_SQUARE_TABLES.values())) * TABLE_UNIT
+
+
+def build_square_values():
+    """
+    SQUARE_VALUES[piece code][square]: material plus table bonus, positive
+    for white pieces and negative for black ones, 0 for anything else.
+    """
+    values = [[0.0] * 64 for piece in range(PIECE_CODES)]
+    for piece_type, table in PIECE_SQUARE_TABLES.items():
+        points = PIECES_POINTS[piece_type]
+        for sq in range(64):
+            mirrored = (7 - sq // 8) * 8 + sq % 8
+            values[Colour.WHITE | piece_type][sq] = points + table[sq] * TABLE_UNIT
+            values[Colour.BLACK | piece_type][sq] = -(points + table[mirrored] * TABLE_UNIT)
+    return values
+
+SQUARE_VALUES = build_square_values()
+SQUARE_VALUES_ARRAY = np.array(SQUARE_VALUES, dtype=np.float64) if np is not None else None
+SQUARES = np.arange(64) if np is not None else None
+
+
+def require_numpy():
+    if np is None:
+        raise ValueError("the numpy evaluator needs numpy installed")
+
+
+def evaluate_board(board, turn):
+    # one board, from the side to move's point of view
+    score = 0.0
+    for sq, piece in enumerate(board):
+        if piece:
+            score += SQUARE_VALUES[piece][sq]
+    return score if turn == Colour.WHITE else -score
+
+
+def evaluate_move(board, score, move):
+    """
+    evaluate_board(board, Colour.WHITE) is score; returns the same for the
+    board after move, without making it.
+    """
+    initial_pos, final_pos = move
+    values = SQUARE_VALUES[board[initial_pos]]
+    return score + values[final_pos] - values[initial_pos] - SQUARE_VALUES[board[final_pos]][final_pos]
+
+
+def evaluate_batch(boards):
+    """
+    boards : (N, 64) uint8 array -> (N,) scores, positive when white is better.
+    """
+    return SQUARE_VALUES_ARRAY[boards, SQUARES].sum(axis=1)
+
+
+def evaluate_children(board, turn, moves):
+    """
+    Scores of the positions after each of moves, from the point of view of
+    turn (the side making them), as a list in the order of moves.
+    """
+    count = len(moves)
+    boards = np.repeat(np.array(board, dtype=np.uint8)[None, :], count, axis=0)
+    squares = np.array(moves, dtype=np.intp).reshape(count, 2)
+    rows = np.arange(count)
+    boards[rows, squares[:, 1]] = boards[rows, squares[:, 0]]
+    boards[rows, squares[:, 0]] = EMPTY
+    scores = evaluate_batch(boards)
+    return (scores if turn == Colour.WHITE else -scores).tolist()
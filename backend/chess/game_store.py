@@ -0,0 +1,183 @@
+import threading, time, atexit
+from collections import OrderedDict
+from contextlib import contextmanager
+from chess.chess_functions import load_game, save_game, new_game
+
+# Live matches are kept in memory and served from there. Changes are only
+# marked dirty; a background thread writes dirty matches back through
+# save_game every flush_interval seconds, so requests never wait on disk
+# writes, except a request for the match being written at that moment: the
+# write holds the match's lock. Each match has its own lock, and the least
+# recently used idle matches are dropped once there are more than max_games
+# in memory. A match's lock is dropped as well once its game is out of
+# memory and no thread holds or waits for it.
+
+DEFAULT_MAX_GAMES = 256
+DEFAULT_FLUSH_INTERVAL = 0.5
+
+
+def snapshot_game(game):
+    return {"board" : list(game["board"]), "turn" : game["turn"], "moves" : list(game["moves"])}
+
+
+class MatchLock:
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        # threads holding or waiting for the lock
+        self.users = 0
+
+
+class GameStore:
+
+    def __init__(self, max_games = DEFAULT_MAX_GAMES, flush_interval = DEFAULT_FLUSH_INTERVAL, loader = load_game, saver = save_game):
+        self.max_games = max_games
+        self.flush_interval = flush_interval
+        self.loader = loader
+        self.saver = saver
+        self._games = OrderedDict()
+        self._locks = {}
+        self._dirty = set()
+        self._store_lock = threading.Lock()
+        self._flusher = None
+        self._stop = threading.Event()
+
+    @contextmanager
+    def lock(self, matchname):
+        """
+        The per-match lock, re-entrant. Hold it around any read-modify-write
+        of a match: with store.lock(matchname): ...
+        """
+        match_lock = self._use_lock(matchname)
+        try:
+            with match_lock.lock:
+                yield
+        finally:
+            self._release_lock(matchname, match_lock)
+
+    def _use_lock(self, matchname):
+        with self._store_lock:
+            match_lock = self._locks.get(matchname)
+            if match_lock is None:
+                match_lock = self._locks[matchname] = MatchLock()
+            match_lock.users += 1
+            return match_lock
+
+    def _release_lock(self, matchname, match_lock):
+        with self._store_lock:
+            match_lock.users -= 1
+            if match_lock.users == 0 and matchname not in self._games:
+                self._locks.pop(matchname, None)
+
+    def get(self, matchname):
+        with self._store_lock:
+            game = self._games.get(matchname)
+            if game is not None:
+                self._games.move_to_end(matchname)
+                return game
+        game = self.loader(matchname)
+        if game is None:
+            return None
+        with self._store_lock:
+            # another thread may have loaded it meanwhile; keep the first copy
+            game = self._games.setdefault(matchname, game)
+            self._games.move_to_end(matchname)
+        self._evict(keep=matchname)
+        return game
+
+    def put(self, matchname, game):
+        with self._store_lock:
+            self._games[matchname] = game
+            self._games.move_to_end(matchname)
+            self._dirty.add(matchname)
+        self._start_flusher()
+        self._evict(keep=matchname)
+        return game
+
+    def mark_dirty(self, matchname):
+        with self._store_lock:
+            self._dirty.add(matchname)
+        self._start_flusher()
+
+    def create(self, matchname):
+        return self.put(matchname, new_game())
+
+    def flush(self):
+        with self._store_lock:
+            dirty = list(self._dirty)
+        for matchname in dirty:
+            # write under the match lock, so a flush and an eviction of the
+            # same match can never land their snapshots out of order
+            with self.lock(matchname):
+                with self._store_lock:
+                    game = self._games.get(matchname)
+                    if matchname not in self._dirty:
+                        continue
+                    self._dirty.discard(matchname)
+                if game is None:
+                    continue
+                try:
+                    self.saver(snapshot_game(game), matchname)
+                except Exception as e:
+                    # keep it dirty, the next flush tries again
+                    with self._store_lock:
+                        self._dirty.add(matchname)
+                    print(e)
+
+    def _evict(self, keep = None):
+        """
+        Drops least recently used matches until max_games are left, never
+        keep (the match the caller is working on). A dirty match is written
+        out first, and stays in memory if that fails.
+        """
+        with self._store_lock:
+            if len(self._games) <= self.max_games:
+                return
+            candidates = [matchname for matchname in self._games if matchname != keep]
+        for matchname in candidates:
+            with self._store_lock:
+                if len(self._games) <= self.max_games:
+                    return
+            match_lock = self._use_lock(matchname)
+            # skip matches some request is working on or waiting for (the
+            # count check also covers this thread, which the RLock lets in)
+            if match_lock.users > 1 or not match_lock.lock.acquire(blocking=False):
+                self._release_lock(matchname, match_lock)
+                continue
+            try:
+                with self._store_lock:
+                    game = self._games.get(matchname)
+                    dirty = matchname in self._dirty
+                if game is not None and dirty:
+                    try:
+                        self.saver(snapshot_game(game), matchname)
+                    except Exception as e:
+                        print(e)
+                        continue
+                with self._store_lock:
+                    self._dirty.discard(matchname)
+                    self._games.pop(matchname, None)
+            finally:
+                match_lock.lock.release()
+                self._release_lock(matchname, match_lock)
+
+    def _start_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._store_lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="game-store-flusher", daemon=True)
+            self._flusher.start()
+        atexit.register(self.close)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(e)
+
+    def close(self):
+        self._stop.set()
+        self.flush()
@@ -0,0 +1,233 @@
+import argparse, json, os, sqlite3, threading, time
+from chess.chess_functions import *
+from chess.zobrist import compute_hash, update_hash
+
+# SQLite match storage. A match is a row in matches plus its moves, one row
+# per ply, so saving a game appends the plies played since the last save
+# instead of rewriting the whole game. Taking moves back deletes the plies
+# from the first one that no longer matches. Every SNAPSHOT_INTERVAL plies the
+# board is stored as well, and loading replays only the moves after the last
+# snapshot. The database runs in WAL mode, so a crash mid-save leaves the
+# previous save intact. Selected with CHESS_STORAGE=sqlite; the file is
+# CHESS_DB_PATH. Existing JSON boards are imported with
+#   python -m chess.match_db --migrate
+
+DEFAULT_DB_PATH = os.environ.get("CHESS_DB_PATH", os.path.join(os.path.dirname(__file__), "..", "matches.db"))
+SNAPSHOT_INTERVAL = 32
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    name TEXT PRIMARY KEY,
+    ply INTEGER NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS moves (
+    match TEXT NOT NULL,
+    ply INTEGER NOT NULL,
+    from_square INTEGER NOT NULL,
+    to_square INTEGER NOT NULL,
+    piece INTEGER NOT NULL,
+    captured INTEGER NOT NULL,
+    position_key INTEGER NOT NULL,
+    PRIMARY KEY (match, ply)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS snapshots (
+    match TEXT NOT NULL,
+    ply INTEGER NOT NULL,
+    board BLOB NOT NULL,
+    turn INTEGER NOT NULL,
+    PRIMARY KEY (match, ply)
+) WITHOUT ROWID;
+"""
+
+
+def signed_key(key):
+    # SQLite integers are signed 64-bit
+    return key - (1 << 64) if key >= (1 << 63) else key
+
+
+def square(pos):
+    return get_position(pos) if isinstance(pos, str) else pos
+
+
+def position_keys(game, first_ply = 0):
+    """
+    {ply : key of the position after that ply} for first_ply onwards, found
+    by unmaking moves from the final position.
+    """
+    key = compute_hash(game["board"], game["turn"])
+    keys = {}
+    for ply in range(len(game["moves"]) - 1, first_ply - 1, -1):
+        keys[ply] = key
+        (move, (piece, captured)) = game["moves"][ply]
+        key = update_hash(key, piece, captured, square(move[0]), square(move[1]))
+    return keys
+
+
+class MatchDatabase:
+
+    def __init__(self, path = DEFAULT_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def load_game(self, matchname = "default"):
+        with self._lock:
+            db = self._connection
+            row = db.execute("SELECT ply FROM matches WHERE name = ?", (matchname,)).fetchone()
+            if row is None:
+                return None
+            ply = row[0]
+            moves = db.execute(
+                "SELECT from_square, to_square, piece, captured FROM moves WHERE match = ? AND ply < ? ORDER BY ply",
+                (matchname, ply)).fetchall()
+            snapshot = db.execute(
+                "SELECT ply, board, turn FROM snapshots WHERE match = ? AND ply <= ? ORDER BY ply DESC LIMIT 1",
+                (matchname, ply)).fetchone()
+
+        start, board, turn = snapshot[0], list(snapshot[1]), snapshot[2]
+        for from_square, to_square, piece, captured in moves[start:]:
+            board[to_square] = piece
+            board[from_square] = EMPTY
+            turn = Colour.BLACK if turn == Colour.WHITE else Colour.WHITE
+        return {
+            "board" : board,
+            "turn" : turn,
+            "moves" : [[[from_square, to_square], [piece, captured]] for from_square, to_square, piece, captured in moves],
+        }
+
+    def save_game(self, game, matchname = "default"):
+        """
+        Brings the stored match in line with game, writing only the plies
+        that differ from what is stored.
+        """
+        now = time.time()
+        with self._lock, self._connection as db:
+            row = db.execute("SELECT ply FROM matches WHERE name = ?", (matchname,)).fetchone()
+            stored_ply = row[0] if row is not None else 0
+            # the first ply where the stored game and this one part ways,
+            # move by move; usually the last stored one, so only the new
+            # plies are hashed
+            stored_moves = db.execute(
+                "SELECT from_square, to_square, piece, captured, position_key FROM moves WHERE match = ? AND ply < ? ORDER BY ply",
+                (matchname, min(stored_ply, len(game["moves"])))).fetchall()
+            common = 0
+            for stored, (move, (piece, captured)) in zip(stored_moves, game["moves"]):
+                if stored[:4] != (square(move[0]), square(move[1]), piece, captured):
+                    break
+                common += 1
+            keys = position_keys(game, max(common - 1, 0))
+            # the same moves from another start position are another game
+            if common > 0 and stored_moves[common - 1][4] != signed_key(keys[common - 1]):
+                common = 0
+                keys = position_keys(game)
+
+            db.execute("DELETE FROM moves WHERE match = ? AND ply >= ?", (matchname, common))
+            db.execute("DELETE FROM snapshots WHERE match = ? AND ply > ?", (matchname, common))
+            rows = []
+            for ply in range(common, len(game["moves"])):
+                (move, (piece, captured)) = game["moves"][ply]
+                rows.append((matchname, ply, square(move[0]), square(move[1]), piece, captured, signed_key(keys[ply])))
+            db.executemany("INSERT INTO moves VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+            # ply 0 is always kept, so games not starting from new_game load too
+            last_snapshot = len(game["moves"]) // SNAPSHOT_INTERVAL * SNAPSHOT_INTERVAL
+            for ply in {0, last_snapshot}:
+                if ply > common or (ply == 0 and common == 0):
+                    board, turn = self.position_at(game, ply)
+                    db.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)", (matchname, ply, bytes(board), turn))
+            db.execute(
+                "INSERT INTO matches VALUES (?, ?, ?, ?) ON CONFLICT(name) DO UPDATE SET ply = excluded.ply, updated = excluded.updated",
+                (matchname, len(game["moves"]), now, now))
+        return game
+
+    def create_game(self, matchname = "default"):
+        game = new_game()
+        with self._lock, self._connection as db:
+            db.execute("DELETE FROM moves WHERE match = ?", (matchname,))
+            db.execute("DELETE FROM snapshots WHERE match = ?", (matchname,))
+            db.execute("DELETE FROM matches WHERE name = ?", (matchname,))
+        self.save_game(game, matchname)
+        return game
+
+    def match_names(self):
+        with self._lock:
+            return [row[0] for row in self._connection.execute("SELECT name FROM matches ORDER BY name")]
+
+    @staticmethod
+    def position_at(game, ply):
+        # unmakes the moves after ply from the current board
+        board = list(game["board"])
+        turn = game["turn"]
+        for (move, (piece, captured)) in reversed(game["moves"][ply:]):
+            board[square(move[0])] = piece
+            board[square(move[1])] = captured
+            turn = Colour.BLACK if turn == Colour.WHITE else Colour.WHITE
+        return board, turn
+
+
+_database = None
+
+def get_database(path = None):
+    """
+    The shared database for path (CHESS_DB_PATH by default), opened on first use.
+    """
+    global _database
+    path = path or DEFAULT_DB_PATH
+    if _database is None or _database.path != path:
+        _database = MatchDatabase(path)
+    return _database
+
+
+def load_game(matchname = "default"):
+    return get_database().load_game(matchname)
+
+def save_game(game, matchname = "default"):
+    return get_database().save_game(game, matchname)
+
+def create_game(matchname = "default"):
+    return get_database().create_game(matchname)
+
+
+def migrate_boards(boards_path, database):
+    """
+    Imports every JSON game in boards_path under its file name.
+    Returns the imported match names.
+    """
+    imported = []
+    for filename in sorted(os.listdir(boards_path)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(boards_path, filename), 'r') as arq:
+            game = json.load(arq)
+        database.save_game(game, filename[:-len(".json")])
+        imported.append(filename[:-len(".json")])
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite match storage")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--migrate", nargs="?", const=BOARDS_PATH, metavar="BOARDS_PATH", help="import every JSON game in this folder (defaults to BOARDS_PATH)")
+    args = parser.parse_args()
+
+    database = MatchDatabase(args.db)
+    if args.migrate:
+        for matchname in migrate_boards(args.migrate, database):
+            print(f"imported {matchname}")
+    for matchname in database.match_names():
+        game = database.load_game(matchname)
+        print(f"{matchname:<30} {len(game['moves'])} plies")
+    database.close()
+
+
+if __name__ == "__main__":
+    main()
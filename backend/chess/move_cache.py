@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+from chess.chess_functions import get_piece_moves, get_legal_moves, get_coordinate, COLOUR_BITS, EMPTY
+from chess.zobrist import compute_hash
+
+# Move maps for the side to move, keyed by the position's Zobrist hash. A move
+# map holds every piece of the side to move (square -> target squares), so
+# click-time highlights and /get_game polls for a position already seen are
+# served without running the move generator again. The least recently used
+# positions are dropped once there are more than max_positions.
+
+DEFAULT_MAX_POSITIONS = 1024
+
+
+def build_move_map(board, turn):
+    # legal moves only; a piece that cannot move maps to []
+    move_map = {sq : [] for sq, piece in enumerate(board) if piece != EMPTY and piece & COLOUR_BITS == turn}
+    for sq, target in get_legal_moves(board, turn):
+        move_map[sq].append(target)
+    return move_map
+
+
+def describe_move_map(move_map):
+    """
+    The move map in coordinates, {'e2' : ['e3', ...]}, for API responses.
+    """
+    return {get_coordinate(sq) : [get_coordinate(target) for target in targets] for sq, targets in move_map.items()}
+
+
+class MoveCache:
+
+    def __init__(self, max_positions = DEFAULT_MAX_POSITIONS):
+        self.max_positions = max_positions
+        self._maps = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_move_map(self, board, turn):
+        """
+        The move map of the side to move. Treat it as read-only, it is shared.
+        """
+        key = compute_hash(board, turn)
+        with self._lock:
+            move_map = self._maps.get(key)
+            if move_map is not None:
+                self._maps.move_to_end(key)
+                self.hits += 1
+                return move_map
+            self.misses += 1
+        move_map = build_move_map(board, turn)
+        with self._lock:
+            self._maps[key] = move_map
+            self._maps.move_to_end(key)
+            while len(self._maps) > self.max_positions:
+                self._maps.popitem(last=False)
+        return move_map
+
+    def get_piece_moves(self, board, turn, square):
+        """
+        Legal moves for pieces of the side to move, from the move map; other
+        squares fall back to chess_functions.get_piece_moves.
+        """
+        move_map = self.get_move_map(board, turn)
+        if square in move_map:
+            return list(move_map[square])
+        return get_piece_moves(board, square)
+
+    def clear(self):
+        with self._lock:
+            self._maps.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._maps)
@@ -0,0 +1,206 @@
+import argparse, glob, json, mmap, os, random, struct, threading
+from chess.chess_functions import *
+from chess.position import Position
+from chess.zobrist import compute_hash
+
+# Opening book: a file of fixed-size 16-byte entries sorted by position key,
+# in the style of Polyglot books. An entry is the Zobrist key of the position
+# (chess.zobrist, so the same key the search uses), the move as from * 64 + to,
+# a weight and a spare 32-bit field. The file is memory-mapped and looked up
+# by binary search, so a probe touches a few pages and the book never has to
+# fit in the server's memory.
+# Build one from stored games, from the backend folder:
+#   python -m chess.opening_book --games "boards/*.json" --output books/book.bin
+
+# key, move, weight, spare
+ENTRY_FORMAT = ">QHHI"
+ENTRY_SIZE = struct.calcsize(ENTRY_FORMAT)
+KEY_FORMAT = ">Q"
+
+MAX_WEIGHT = 0xFFFF
+# only this many plies of each game go into the book
+DEFAULT_BOOK_PLIES = 20
+
+DEFAULT_BOOK_PATH = os.environ.get("CHESS_BOOK_PATH", os.path.join(os.path.dirname(__file__), "..", "books", "book.bin"))
+
+
+def encode_move(move):
+    return move[0] * 64 + move[1]
+
+def decode_move(code):
+    return [code // 64, code % 64]
+
+
+class OpeningBook:
+    """
+    Read-only view of a book file. lookup returns the [move, weight] pairs
+    stored for a position key, heaviest first.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self.entries = size // ENTRY_SIZE
+        # mmap refuses empty files
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def _key_at(self, index):
+        return struct.unpack_from(KEY_FORMAT, self._map, index * ENTRY_SIZE)[0]
+
+    def _first_index(self, key):
+        low, high = 0, self.entries
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def lookup(self, key):
+        moves = []
+        index = self._first_index(key)
+        while index < self.entries:
+            entry_key, move, weight, _ = struct.unpack_from(ENTRY_FORMAT, self._map, index * ENTRY_SIZE)
+            if entry_key != key:
+                break
+            moves.append([decode_move(move), weight])
+            index += 1
+        return moves
+
+    def choose(self, key, rng = random):
+        """
+        A move picked at random in proportion to its weight, or None.
+        """
+        moves = self.lookup(key)
+        total = sum(weight for _, weight in moves)
+        if total == 0:
+            return None
+        pick = rng.randrange(total)
+        for move, weight in moves:
+            if pick < weight:
+                return move
+            pick -= weight
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+
+def count_book_moves(games, max_plies = DEFAULT_BOOK_PLIES):
+    """
+    How often each (key, move) was played in the first max_plies of games.
+    A game is a game dict or its "moves" list; every game is replayed from the
+    start position and stops at its first move that is not playable.
+    """
+    start = new_game()
+    counts = {}
+    for game in games:
+        moves = game["moves"] if isinstance(game, dict) else game
+        position = Position(start["board"], start["turn"])
+        for move, _ in moves[:max_plies]:
+            key = position.hash
+            try:
+                if not position.make_move(move):
+                    break
+            except ValueError:
+                break
+            entry = key, encode_move(position.last_move()[:2])
+            counts[entry] = counts.get(entry, 0) + 1
+    return counts
+
+
+def write_book(counts, path, min_count = 1):
+    """
+    Writes (key, move) -> count as a sorted book file. Returns the number of
+    entries written.
+    """
+    entries = sorted(
+        ((key, move, min(count, MAX_WEIGHT)) for (key, move), count in counts.items() if count >= min_count),
+        key=lambda entry: (entry[0], -entry[2], entry[1]),
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "wb") as arq:
+        for key, move, weight in entries:
+            arq.write(struct.pack(ENTRY_FORMAT, key, move, weight, 0))
+    return len(entries)
+
+
+def build_book(games, path, max_plies = DEFAULT_BOOK_PLIES, min_count = 1):
+    return write_book(count_book_moves(games, max_plies), path, min_count)
+
+
+_book = None
+_book_path = None
+_book_lock = threading.Lock()
+
+
+def get_book(path = None):
+    """
+    The shared book for path (CHESS_BOOK_PATH by default), opened on first
+    use. None when there is no book file. A book replaced by one for another
+    path is not closed, since other threads may still be probing it; it is
+    unmapped once the last of them lets go of it.
+    """
+    global _book, _book_path
+    path = path or DEFAULT_BOOK_PATH
+    with _book_lock:
+        if _book is not None and _book_path == path:
+            return _book
+        if not os.path.exists(path):
+            return None
+        _book = OpeningBook(path)
+        _book_path = path
+        return _book
+
+
+def probe_book(game, rng = random, path = None):
+    """
+    A book move for the game's position, or None. The move is checked against
+    the board, so a key collision can never play an impossible move.
+    """
+    book = get_book(path)
+    if book is None:
+        return None
+    board = game["board"]
+    move = book.choose(compute_hash(board, game["turn"]), rng)
+    if move is None:
+        return None
+    if not is_legal_move(board, game["turn"], move[0], move[1]):
+        return None
+    return move
+
+
+def load_games(patterns):
+    """
+    Games from JSON files (one game dict each) and JSONL files (one game dict
+    or moves list per line).
+    """
+    games = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            with open(path, "r") as arq:
+                if path.endswith(".jsonl"):
+                    games.extend(json.loads(line) for line in arq if line.strip())
+                else:
+                    games.append(json.load(arq))
+    return games
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an opening book from stored games")
+    parser.add_argument("--games", action="append", required=True, help="glob of .json game files or .jsonl files; may be repeated")
+    parser.add_argument("--output", default=DEFAULT_BOOK_PATH)
+    parser.add_argument("--plies", type=int, default=DEFAULT_BOOK_PLIES)
+    parser.add_argument("--min-count", type=int, default=1, help="drop moves played fewer times than this")
+    args = parser.parse_args()
+
+    games = load_games(args.games)
+    entries = build_book(games, args.output, args.plies, args.min_count)
+    print(f"{entries} entries from {len(games)} games written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import os, threading, time, random, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import chess.botV2 as botV2
+
+# Parallel root search: the root moves are dealt round-robin to worker
+# processes, each one runs its own iterative deepening (with its own
+# transposition table) over its share, and the results are merged at the
+# deepest depth every worker finished. There is one pool of MAX_WORKERS
+# processes for the whole server, shared by every request whatever worker
+# count it asks for, and it stays up between requests, so the workers'
+# tables stay warm too. Workers are never forked from the server itself: by
+# the time the pool starts it runs request, flusher, job and ponder threads,
+# and a fork would copy whatever locks they hold into the children.
+
+# 1 keeps get_bot_move serial unless a deployment opts in
+DEFAULT_WORKERS = int(os.environ.get("CHESS_SEARCH_WORKERS", 1))
+MAX_WORKERS = os.cpu_count() or 1
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def clamp_workers(workers):
+    return max(1, min(workers, MAX_WORKERS))
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context(START_METHOD))
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+def search_root_moves(game, root_moves, backend, max_depth, time_limit, node_limit, clear_table, collect_stats = False, quiescence = True, evaluator = "material"):
+    """
+    Runs in a worker: iterative deepening over root_moves only. Returns every
+    finished iteration as (depth, moves, scores), the node count and the stats
+    (None unless collect_stats).
+    """
+    position = botV2.prepare_backend(game, backend)
+    with botV2.TRANSPOSITION_TABLES.borrow(botV2.table_kind(quiescence, evaluator)) as table:
+        if clear_table:
+            table.clear()
+        table.new_search()
+        context = botV2.new_search_context(time_limit, node_limit, collect_stats, quiescence=quiescence, evaluator=evaluator, table=table)
+        iterations = list(botV2.iterative_deepening(position, max_depth, context, root_moves))
+    return iterations, context["nodes"], context["stats"]
+
+
+def merge_stats(all_stats):
+    merged = botV2.new_search_stats()
+    for stats in all_stats:
+        for name in ("leaf_evaluations", "beta_cutoffs", "first_move_cutoffs", "tt_hits", "quiescence_nodes"):
+            merged[name] += stats[name]
+        merged["max_ply"] = max(merged["max_ply"], stats["max_ply"])
+        merged["root_moves"].extend(stats["root_moves"])
+    return merged
+
+
+def search_best_move_parallel(game, workers = DEFAULT_WORKERS, backend = "list", max_depth = botV2.DEFAULT_DEPTH, time_limit = None, node_limit = None, seed = None, collect_stats = False, quiescence = True, evaluator = "material"):
+    start = time.perf_counter()
+    workers = clamp_workers(workers)
+    rng = random if seed is None else random.Random(seed)
+    root = botV2.prepare_backend(game, backend)
+    allie = root.generate_moves()
+    # same static order in every run, so the split is deterministic too
+    context = botV2.new_search_context()
+    botV2.order_moves(root.board, allie, None, context["killers"][0], context["history"])
+    chunks = [allie[i::workers] for i in range(workers) if allie[i::workers]]
+    if not chunks:
+        return {"move" : None, "score" : None, "depth" : 0, "nodes" : 0, "elapsed" : time.perf_counter() - start}
+
+    # only the position travels to the workers, not the move history
+    plain_game = {"board" : list(game["board"]), "turn" : game["turn"], "moves" : []}
+    worker_node_limit = None if node_limit is None else max(1, node_limit // len(chunks))
+    pool = get_pool()
+    futures = [
+        pool.submit(search_root_moves, plain_game, chunk, backend, max_depth, time_limit, worker_node_limit, seed is not None, collect_stats, quiescence, evaluator)
+        for chunk in chunks
+    ]
+    results = [future.result() for future in futures]
+
+    depth = min(len(iterations) for iterations, _, _ in results)
+    merged_moves = []
+    merged_scores = []
+    for iterations, _, _ in results:
+        _, moves, scores = iterations[depth - 1]
+        merged_moves.extend(moves)
+        merged_scores.extend(scores)
+
+    result = botV2.pick_move(merged_moves, merged_scores, depth, rng)
+    result["nodes"] = sum(nodes for _, nodes, _ in results)
+    result["elapsed"] = time.perf_counter() - start
+    if collect_stats:
+        # per-move timings come from each worker's own last iteration
+        result["stats"] = botV2.finish_search_stats(merge_stats(stats for _, _, stats in results), result["nodes"], result["elapsed"])
+        result["stats"]["depth"] = depth
+        result["stats"]["workers"] = len(chunks)
+    return result
@@ -0,0 +1,56 @@
+import time
+from chess.chess_functions import *
+import chess.botV2 as botV2
+
+# perft counts the leaf nodes of the full move tree to a fixed depth. Node
+# counts pin down the move generator's behaviour, so any change to it (or a
+# new backend) can be checked against stored numbers before it is trusted.
+
+
+def perft(position, depth):
+    if depth <= 0:
+        return 1
+    moves = position.generate_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        position.make_move_unchecked(move[0], move[1])
+        nodes += perft(position, depth - 1)
+        position.unmake_move()
+    return nodes
+
+
+def divide(position, depth):
+    """
+    Node count under every root move, keyed as 'e2e3'.
+    """
+    counts = {}
+    for move in position.generate_moves():
+        position.make_move_unchecked(move[0], move[1])
+        counts[get_move_notation(move)] = perft(position, depth - 1)
+        position.unmake_move()
+    return counts
+
+
+def prepare_perft_game(game, backend = "list"):
+    return botV2.prepare_backend(game, backend)
+
+
+def timed_perft(game, max_depth, backend = "list"):
+    """
+    Runs perft for every depth up to max_depth and returns one record per depth.
+    """
+    position = prepare_perft_game(game, backend)
+    records = []
+    for depth in range(1, max_depth + 1):
+        start = time.perf_counter()
+        nodes = perft(position, depth)
+        elapsed = time.perf_counter() - start
+        records.append({
+            "depth" : depth,
+            "nodes" : nodes,
+            "seconds" : elapsed,
+            "nodes_per_second" : nodes / elapsed if elapsed > 0 else None,
+        })
+    return records
@@ -0,0 +1,153 @@
+import os, threading
+from collections import OrderedDict
+import chess.botV2 as botV2
+from chess.chess_functions import move_piece
+
+# Pondering: once the bot has moved, guess the opponent's reply and keep
+# searching the position after it in a background thread. If the opponent
+# plays the guessed move, the next bot move is served from that search, or
+# at least starts from what it learned: a transposition table full of it
+# and its killer and history tables. Any other reply just sets the stop
+# event. The guess itself is made in the ponder thread, so the request that
+# started it does not wait for it.
+
+# the ponder search may go this many plies past the requested depth, since
+# the opponent's thinking time is free
+PONDER_EXTRA_DEPTH = 2
+# at most this many matches ponder at once; starting one more stops the
+# longest-running ponder
+MAX_PONDERS = int(os.environ.get("CHESS_MAX_PONDERS", 2))
+# seconds a ponder may search when the request set no budget of its own
+DEFAULT_PONDER_TIME_LIMIT = 30
+
+
+class Ponder:
+
+    def __init__(self, matchname, game, options):
+        self.matchname = matchname
+        self.game = game
+        self.options = options
+        # set by the thread once the reply is guessed
+        self.position = None
+        self.predicted_move = None
+        self.result = None
+        self.ordering = botV2.new_ordering()
+        self.hit = False
+        self.stop_event = threading.Event()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"ponder-{matchname}", daemon=True)
+
+    def _record(self, result):
+        self.result = result
+
+    def _run(self):
+        try:
+            predicted_move = predict_reply(self.game)
+            if predicted_move is None or self.stop_event.is_set():
+                return
+            position = {"board" : list(self.game["board"]), "turn" : self.game["turn"], "moves" : []}
+            move_piece(position, predicted_move)
+            position["moves"] = []
+            self.predicted_move = predicted_move
+            self.position = position
+            botV2.search_best_move(position, on_iteration=self._record, stop_event=self.stop_event, ordering=self.ordering, **self.options)
+        except Exception as e:
+            print(e)
+        finally:
+            self.done.set()
+
+    def matches(self, game):
+        position = self.position
+        return position is not None and game["turn"] == position["turn"] and list(game["board"]) == position["board"]
+
+    def stop(self):
+        self.stop_event.set()
+
+
+_ponders = OrderedDict()
+_lock = threading.Lock()
+
+
+def predict_reply(game):
+    """
+    The opponent's expected reply: the best move the table holds for the
+    position, or a short search's choice when it holds none.
+    """
+    position = botV2.prepare_backend(game, "list")
+    # the table the bot's own search just gave back
+    with botV2.TRANSPOSITION_TABLES.borrow(botV2.table_kind(True)) as table:
+        entry = table.probe(position.hash)
+    if entry is not None and entry[4] in position.generate_moves():
+        return entry[4]
+    return botV2.search_best_move(game, max_depth=2, use_book=False)["move"]
+
+
+def start_pondering(matchname, game, max_depth = botV2.DEFAULT_DEPTH, backend = "list", time_limit = None, node_limit = None):
+    """
+    Starts pondering on a copy of game, the position after the bot's move.
+    The search keeps the request's time and node budget, or gets
+    DEFAULT_PONDER_TIME_LIMIT when it had none.
+    """
+    stop_pondering(matchname)
+    if time_limit is None and node_limit is None:
+        time_limit = DEFAULT_PONDER_TIME_LIMIT
+    options = {
+        "max_depth" : min(max_depth + PONDER_EXTRA_DEPTH, botV2.MAX_PLY - 1),
+        "backend" : backend,
+        "time_limit" : time_limit,
+        "node_limit" : node_limit,
+    }
+    ponder = Ponder(matchname, {"board" : list(game["board"]), "turn" : game["turn"], "moves" : []}, options)
+    with _lock:
+        _ponders[matchname] = ponder
+        oldest = []
+        while len(_ponders) > MAX_PONDERS:
+            oldest.append(_ponders.popitem(last=False)[1])
+    for other in oldest:
+        other.stop()
+    ponder.thread.start()
+    return ponder
+
+
+def stop_pondering(matchname):
+    with _lock:
+        ponder = _ponders.pop(matchname, None)
+    if ponder is not None:
+        ponder.stop()
+    return ponder
+
+
+def opponent_moved(matchname, game):
+    """
+    Called with the live game after the opponent's move was played. A wrong
+    guess stops the ponder search straight away; a right one lets it keep going.
+    """
+    with _lock:
+        ponder = _ponders.get(matchname)
+    if ponder is None:
+        return False
+    if ponder.matches(game):
+        ponder.hit = True
+        return True
+    stop_pondering(matchname)
+    return False
+
+
+def take_ponder_result(matchname, game, max_depth):
+    """
+    (result, ordering) for game. result is the ponder result if it already
+    reached max_depth, else None; ordering is then the ponder's killer and
+    history tables for the real search to continue from (None when there was
+    no matching ponder). Either way the ponder stops here; a shallower one
+    has still filled the transposition table the real search is about to use.
+    """
+    ponder = stop_pondering(matchname)
+    if ponder is None or not ponder.hit or not ponder.matches(game):
+        return None, None
+    result = ponder.result
+    if result is None or result["move"] is None or result["depth"] < max_depth:
+        # let the ponder thread hand its tables back before the real search
+        ponder.done.wait()
+        return None, ponder.ordering
+    result = dict(result, pondered=True)
+    return result, None
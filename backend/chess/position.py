@@ -0,0 +1,169 @@
+from bisect import bisect_left, insort
+from chess.chess_functions import *
+from chess.zobrist import compute_hash, update_hash
+
+# Compact search position: the board is a 64-byte bytearray and the move
+# history is a preallocated bytearray of fixed-width undo records, so making
+# and unmaking moves builds no tuples and grows no lists. Hash, material and
+# the squares of each side's pieces are kept up to date incrementally, so move
+# generation only visits live pieces. Converts to and from the usual JSON game dict without loss.
+# The bitboard backend (chess.bitboard.BitboardPosition) subclasses it.
+
+# undo record: initial square, final square, moved piece, captured piece, flags
+UNDO_RECORD_SIZE = 5
+# flags: the move was recorded with 'e2'-style coordinates
+STRING_NOTATION = 1
+
+DEFAULT_UNDO_CAPACITY = 512
+
+
+class Position:
+    __slots__ = ("board", "turn", "hash", "material", "pieces", "undo", "ply")
+
+    def __init__(self, board, turn, undo_capacity = DEFAULT_UNDO_CAPACITY):
+        self.board = bytearray(board)
+        self.turn = int(turn)
+        self.hash = compute_hash(self.board, self.turn)
+        self.material = count_material(self.board)
+        # pieces[colour] lists that side's squares, kept ascending so moves
+        # come out in the same order as a board scan without sorting
+        self.pieces = get_piece_lists(self.board)
+        self.undo = bytearray(undo_capacity * UNDO_RECORD_SIZE)
+        self.ply = 0
+
+    @classmethod
+    def from_game(cls, game, keep_history = True):
+        moves = game["moves"] if keep_history else []
+        position = cls(game["board"], game["turn"], max(DEFAULT_UNDO_CAPACITY, 2 * len(moves)))
+        for move, (piece, captured) in moves:
+            flags = STRING_NOTATION if isinstance(move[0], str) else 0
+            initial_pos = get_position(move[0]) if flags else move[0]
+            final_pos = get_position(move[1]) if flags else move[1]
+            position._push(initial_pos, final_pos, piece, captured, flags)
+        return position
+
+    def to_game(self):
+        moves = []
+        undo = self.undo
+        for i in range(0, self.ply * UNDO_RECORD_SIZE, UNDO_RECORD_SIZE):
+            initial_pos, final_pos, piece, captured, flags = undo[i:i + UNDO_RECORD_SIZE]
+            if flags & STRING_NOTATION:
+                move = [get_coordinate(initial_pos), get_coordinate(final_pos)]
+            else:
+                move = [initial_pos, final_pos]
+            moves.append([move, [piece, captured]])
+        return {"board" : list(self.board), "turn" : Colour(self.turn), "moves" : moves}
+
+    def copy(self):
+        position = self.__class__.__new__(self.__class__)
+        position.board = bytearray(self.board)
+        position.turn = self.turn
+        position.hash = self.hash
+        position.material = dict(self.material)
+        position.pieces = {colour : list(squares) for colour, squares in self.pieces.items()}
+        position.undo = bytearray(self.undo)
+        position.ply = self.ply
+        return position
+
+    def _push(self, initial_pos, final_pos, piece, captured, flags = 0):
+        undo = self.undo
+        start = self.ply * UNDO_RECORD_SIZE
+        if start + UNDO_RECORD_SIZE > len(undo):
+            undo.extend(bytes(len(undo)))
+        undo[start] = initial_pos
+        undo[start + 1] = final_pos
+        undo[start + 2] = piece
+        undo[start + 3] = captured
+        undo[start + 4] = flags
+        self.ply += 1
+
+    def piece_positions(self, turn):
+        return list(self.pieces[turn])
+
+    def generate_moves(self):
+        board = self.board
+        all_moves = []
+        for p in self.pieces[self.turn]:
+            all_moves.extend([p, i] for i in get_piece_moves(board, p))
+        return filter_legal_moves(board, self.turn, all_moves)
+
+    def generate_captures(self):
+        board = self.board
+        captures = []
+        for p in self.pieces[self.turn]:
+            captures.extend([p, i] for i in get_piece_captures(board, p))
+        return filter_legal_moves(board, self.turn, captures)
+
+    def in_check(self):
+        return is_in_check(self.board, self.turn)
+
+    def make_move(self, move):
+        """
+        Same checks as move_piece: raises on the wrong colour and ignores moves
+        that are not legal. Returns whether the move was played.
+        For API input; the search uses make_move_unchecked.
+        """
+        initial_pos = get_position(move[0]) if isinstance(move[0], str) else move[0]
+        final_pos = get_position(move[1]) if isinstance(move[1], str) else move[1]
+        board = self.board
+        if board[initial_pos] & COLOUR_BITS != self.turn:
+            raise ValueError("WRONG TURN ERROR")
+        if not is_legal_move(board, self.turn, initial_pos, final_pos):
+            return False
+        self.make_move_unchecked(initial_pos, final_pos, STRING_NOTATION if isinstance(move[0], str) else 0)
+        return True
+
+    def make_move_unchecked(self, initial_pos, final_pos, flags = 0):
+        """
+        Plays a move given as integer squares without checking it. Only for
+        moves that came out of generate_moves for this position.
+        """
+        board = self.board
+        piece = board[initial_pos]
+        captured = board[final_pos]
+        self._push(initial_pos, final_pos, piece, captured, flags)
+        board[final_pos] = piece
+        board[initial_pos] = EMPTY
+        if captured:
+            self.material[captured & COLOUR_BITS] -= POINTS_BY_TYPE[captured & PIECE_BITS]
+            squares = self.pieces[captured & COLOUR_BITS]
+            del squares[bisect_left(squares, final_pos)]
+        squares = self.pieces[piece & COLOUR_BITS]
+        del squares[bisect_left(squares, initial_pos)]
+        insort(squares, final_pos)
+        self.hash = update_hash(self.hash, piece, captured, initial_pos, final_pos)
+        self.turn ^= COLOUR_BITS
+
+    def unmake_move(self):
+        if self.ply == 0:
+            return False
+        self.ply -= 1
+        undo = self.undo
+        start = self.ply * UNDO_RECORD_SIZE
+        initial_pos = undo[start]
+        final_pos = undo[start + 1]
+        piece = undo[start + 2]
+        captured = undo[start + 3]
+        board = self.board
+        board[initial_pos] = piece
+        board[final_pos] = captured
+        squares = self.pieces[piece & COLOUR_BITS]
+        del squares[bisect_left(squares, final_pos)]
+        insort(squares, initial_pos)
+        if captured:
+            self.material[captured & COLOUR_BITS] += POINTS_BY_TYPE[captured & PIECE_BITS]
+            insort(self.pieces[captured & COLOUR_BITS], final_pos)
+        self.hash = update_hash(self.hash, piece, captured, initial_pos, final_pos)
+        self.turn ^= COLOUR_BITS
+        return True
+
+    def last_move(self):
+        if self.ply == 0:
+            return None
+        start = (self.ply - 1) * UNDO_RECORD_SIZE
+        return self.undo[start:start + UNDO_RECORD_SIZE]
+
+    def evaluate(self):
+        # material from the side to move's point of view
+        material = self.material
+        return material[self.turn] - material[self.turn ^ COLOUR_BITS]
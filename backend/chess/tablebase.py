@@ -0,0 +1,464 @@
+import argparse, mmap, os, random, struct, threading, time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from chess.chess_functions import *
+
+# Endgame tablebases for positions with a handful of pieces. A table stores,
+# for every placement of its pieces and either side to move, the distance to
+# mate plus 2: odd when the side to move mates in value - 2 plies, even when
+# it is mated in value - 2 plies (2 is mate on the board), 0 when neither
+# side can force it. Positions where the side not to move is in check cannot
+# arise and are stored as INVALID. Tables are built by retrograde analysis on
+# the project's legal move generator: worker processes count every
+# position's successors and score its captures, then values spread backwards
+# from the mates level by level, each settled position reaching its
+# predecessors by taking moves back. Only a few bytes per position are held
+# while building, about 250 MB for a 4-piece table. Captures lead into
+# smaller tables, which are built first.
+#
+# File layout: header (magic, table count), a directory of (signature,
+# offset, size) entries, then one byte per position for each table. The file
+# is memory-mapped, so a probe is one index computation and one byte read.
+# Build from the backend folder:
+#   python -m chess.tablebase KQK KRK --workers 4
+#   python -m chess.tablebase KQKR --output tablebases/tablebase.bin
+
+MAGIC = b"CTB1"
+HEADER_FORMAT = ">4sI"
+# piece codes (zero-padded), offset, size
+DIRECTORY_FORMAT = ">8sQQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+DIRECTORY_SIZE = struct.calcsize(DIRECTORY_FORMAT)
+
+MAX_PIECES = 4
+DRAW = 0
+INVALID = 255
+MAX_DISTANCE = 254
+# no external successor of that kind, in the worker arrays
+NONE = 255
+
+DEFAULT_TABLEBASE_PATH = os.environ.get("CHESS_TABLEBASE_PATH", os.path.join(os.path.dirname(__file__), "..", "tablebases", "tablebase.bin"))
+
+LETTERS_TO_PIECES = {"P" : Piece.PAWN, "N" : Piece.KNIGHT, "B" : Piece.BISHOP, "R" : Piece.ROOK, "Q" : Piece.QUEEN, "K" : Piece.KING}
+
+WHITE_KING = Colour.WHITE | Piece.KING
+BLACK_KING = Colour.BLACK | Piece.KING
+
+
+# ------------------------------------------------------------------------------------------ #
+# ------------------------------------- INDEXING ------------------------------------------- #
+# ------------------------------------------------------------------------------------------ #
+
+def parse_signature(name):
+    """
+    'KQK' or 'KQvK' -> piece codes, highest first. The second K starts black's pieces.
+    """
+    letters = name.upper().replace("V", "")
+    if letters.count("K") != 2 or letters[0] != "K":
+        raise ValueError(f"bad tablebase name {name}")
+    black_start = letters.index("K", 1)
+    pieces = [Colour.WHITE | LETTERS_TO_PIECES[letter] for letter in letters[:black_start]]
+    pieces += [Colour.BLACK | LETTERS_TO_PIECES[letter] for letter in letters[black_start:]]
+    return tuple(sorted(pieces, reverse=True))
+
+
+def signature_name(signature):
+    white = "".join(IDS_TO_PIECES[piece & PIECE_BITS] for piece in signature if piece & COLOUR_BITS == Colour.WHITE)
+    black = "".join(IDS_TO_PIECES[piece & PIECE_BITS] for piece in signature if piece & COLOUR_BITS == Colour.BLACK)
+    return f"{white}v{black}"
+
+
+def board_signature(board):
+    """
+    The signature and the squares of the pieces in signature order (equal
+    pieces by square), or None with more than MAX_PIECES pieces.
+    """
+    pieces = []
+    for sq, piece in enumerate(board):
+        if piece != EMPTY:
+            pieces.append((piece, sq))
+            if len(pieces) > MAX_PIECES:
+                return None
+    pieces.sort(key=lambda entry: (-entry[0], entry[1]))
+    return tuple(piece for piece, _ in pieces), [sq for _, sq in pieces]
+
+
+def table_size(signature):
+    return 2 * 64 ** len(signature)
+
+
+def position_index(squares, turn):
+    index = 0
+    for sq in squares:
+        index = index * 64 + sq
+    return index * 2 + (turn == Colour.BLACK)
+
+
+def sub_signatures(signature):
+    """
+    The tables a capture in this one leads into (kings are never captured).
+    """
+    subs = set()
+    for i, piece in enumerate(signature):
+        if piece & PIECE_BITS != Piece.KING:
+            subs.add(signature[:i] + signature[i + 1:])
+    return subs
+
+
+def build_order(signatures):
+    """
+    The signatures and everything they depend on, smallest first.
+    """
+    needed = set()
+    pending = list(signatures)
+    while pending:
+        signature = pending.pop()
+        if signature not in needed:
+            needed.add(signature)
+            pending.extend(sub_signatures(signature))
+    return sorted(needed, key=lambda signature: (len(signature), signature))
+
+
+# ------------------------------------------------------------------------------------------ #
+# ------------------------------------- BUILDING ------------------------------------------- #
+# ------------------------------------------------------------------------------------------ #
+
+_worker_tables = {}
+
+def init_worker(tables):
+    global _worker_tables
+    _worker_tables = tables
+
+
+def successor_value(board, turn):
+    """
+    Value of a position in an already built (smaller) table, from the point
+    of view of turn, the side to move there.
+    """
+    signature, squares = board_signature(board)
+    return _worker_tables[signature][position_index(squares, turn)]
+
+
+def generate_chunk(signature, first_square):
+    """
+    Runs in a worker: every position whose first piece stands on
+    first_square. Returns, per position, the number of legal successors
+    inside the table (INVALID for impossible placements), plus what the
+    captures leading out of the table give: the quickest loss for the
+    opponent, the slowest win for the opponent (1 when checkmated, so the
+    position settles at 2), and whether any of them (or stalemate) is a draw.
+    The successors themselves are not kept; solve finds the way back from a
+    position with unmoves.
+    """
+    count = len(signature)
+    chunk_size = table_size(signature) // 64
+    counts = bytearray([INVALID]) * chunk_size
+    ext_loss = bytearray([NONE]) * chunk_size
+    ext_win = bytearray(chunk_size)
+    ext_draw = bytearray(chunk_size)
+    board = [EMPTY] * 64
+
+    for offset in range(chunk_size // 2):
+        squares = [first_square]
+        rest = offset
+        for _ in range(count - 1):
+            squares.insert(1, rest % 64)
+            rest //= 64
+        if len(set(squares)) != count:
+            continue
+        for piece, sq in zip(signature, squares):
+            board[sq] = piece
+
+        for turn in (Colour.WHITE, Colour.BLACK):
+            if is_in_check(board, turn ^ COLOUR_BITS):
+                continue
+            local = offset * 2 + (turn == Colour.BLACK)
+            internal = 0
+            loss, win, draw = NONE, 0, False
+            moves = []
+            for sq, piece in zip(squares, signature):
+                if piece & COLOUR_BITS == turn:
+                    moves.extend([sq, target] for target in get_piece_moves(board, sq))
+            moves = filter_legal_moves(board, turn, moves)
+            for sq, target in moves:
+                captured = board[target]
+                if not captured:
+                    internal += 1
+                    continue
+                board[target] = board[sq]
+                board[sq] = EMPTY
+                value = successor_value(board, turn ^ COLOUR_BITS)
+                board[sq] = board[target]
+                board[target] = captured
+                if value == DRAW:
+                    draw = True
+                elif value % 2 == 0:
+                    loss = min(loss, value)
+                else:
+                    win = max(win, value)
+            if not moves:
+                if is_in_check(board, turn):
+                    win = 1
+                else:
+                    draw = True
+            counts[local] = internal
+            ext_loss[local] = loss
+            ext_win[local] = win
+            ext_draw[local] = draw
+
+        for sq in squares:
+            board[sq] = EMPTY
+    return bytes(counts), bytes(ext_loss), bytes(ext_win), bytes(ext_draw)
+
+
+def canonical_squares(signature, squares):
+    for i in range(1, len(signature)):
+        if signature[i] == signature[i - 1] and squares[i] < squares[i - 1]:
+            squares = list(squares)
+            squares[i - 1], squares[i] = squares[i], squares[i - 1]
+    return squares
+
+
+def predecessors(signature, index, board):
+    """
+    Indices of the positions in the same table that lead to index with one
+    non-capturing move: the side that just moved takes a move back. board is
+    an empty scratch board, left empty again. Pawns step back one square;
+    every other piece moves the same way both ways.
+    """
+    count = len(signature)
+    turn = Colour.BLACK if index & 1 else Colour.WHITE
+    mover = turn ^ COLOUR_BITS
+    rest = index >> 1
+    squares = [0] * count
+    for i in range(count - 1, -1, -1):
+        squares[i] = rest % 64
+        rest //= 64
+    for piece, sq in zip(signature, squares):
+        board[sq] = piece
+
+    found = []
+    for i, sq in enumerate(squares):
+        piece = signature[i]
+        if piece & COLOUR_BITS != mover:
+            continue
+        if piece & PIECE_BITS == Piece.PAWN:
+            origin = sq - 8 if mover == Colour.WHITE else sq + 8
+            origins = [origin] if 0 <= origin < 64 and board[origin] == EMPTY else []
+        else:
+            origins = [origin for origin in get_piece_moves(board, sq) if board[origin] == EMPTY]
+        for origin in origins:
+            moved = list(squares)
+            moved[i] = origin
+            # equal pieces are indexed by square, like board_signature does
+            found.append(position_index(canonical_squares(signature, moved), mover))
+
+    for sq in squares:
+        board[sq] = EMPTY
+    return found
+
+
+def solve(signature, counts, ext_loss, ext_win, ext_draw):
+    """
+    Retrograde pass: settles positions in order of distance, so each gets
+    the quickest win or the slowest loss. Returns one byte per position.
+    Only the per-position arrays are held, a few bytes per position, so
+    4-piece tables fit in memory.
+    """
+    size = len(counts)
+    values = bytearray(size)
+    remaining = bytearray(counts)
+    levels = {}
+    for index in range(size):
+        if counts[index] == INVALID:
+            values[index] = INVALID
+        elif ext_loss[index] != NONE:
+            levels.setdefault(ext_loss[index] + 1, array("I")).append(index)
+        elif counts[index] == 0 and not ext_draw[index]:
+            # checkmated, or every move is a capture that loses
+            levels.setdefault(ext_win[index] + 1, array("I")).append(index)
+
+    board = [EMPTY] * 64
+    level = 1
+    while levels:
+        settled = levels.pop(level, ())
+        if level > MAX_DISTANCE:
+            raise ValueError("distance does not fit in a byte")
+        for index in settled:
+            if values[index]:
+                continue
+            values[index] = level
+            for predecessor in predecessors(signature, index, board):
+                if values[predecessor]:
+                    continue
+                if level % 2 == 0:
+                    levels.setdefault(level + 1, array("I")).append(predecessor)
+                else:
+                    remaining[predecessor] -= 1
+                    if remaining[predecessor] == 0 and not ext_draw[predecessor] and ext_loss[predecessor] == NONE:
+                        levels.setdefault(max(level, ext_win[predecessor]) + 1, array("I")).append(predecessor)
+        level += 1
+    return bytes(values)
+
+
+def build_table(signature, tables, workers = 1):
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(tables,)) as pool:
+        chunks = list(pool.map(generate_chunk, [signature] * 64, range(64)))
+    counts, ext_loss, ext_win, ext_draw = (b"".join(parts) for parts in zip(*chunks))
+    del chunks
+    return solve(signature, counts, ext_loss, ext_win, ext_draw)
+
+
+def write_tablebase(tables, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    offset = HEADER_SIZE + DIRECTORY_SIZE * len(tables)
+    with open(path, "wb") as arq:
+        arq.write(struct.pack(HEADER_FORMAT, MAGIC, len(tables)))
+        for signature, values in tables.items():
+            arq.write(struct.pack(DIRECTORY_FORMAT, bytes(signature), offset, len(values)))
+            offset += len(values)
+        for values in tables.values():
+            arq.write(values)
+
+
+def build_tablebase(names, path, workers = 1, log = print):
+    """
+    Builds the named tables and every smaller one they lead into, and writes
+    them all to path.
+    """
+    tables = {}
+    for signature in build_order(parse_signature(name) for name in names):
+        start = time.perf_counter()
+        tables[signature] = build_table(signature, tables, workers)
+        values = tables[signature]
+        wins = sum(1 for value in values if value != INVALID and value % 2 == 1)
+        log(f"{signature_name(signature):<8} {len(values):>10} positions  {wins:>10} wins for the side to move  {time.perf_counter() - start:.1f}s")
+    write_tablebase(tables, path)
+    return tables
+
+
+# ------------------------------------------------------------------------------------------ #
+# -------------------------------------- PROBING ------------------------------------------- #
+# ------------------------------------------------------------------------------------------ #
+
+class Tablebase:
+    """
+    Read-only view of a tablebase file. probe returns the stored value of a
+    board, or None when there is no table for its pieces.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = struct.unpack_from(HEADER_FORMAT, self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a tablebase")
+        self.offsets = {}
+        for i in range(count):
+            codes, offset, _ = struct.unpack_from(DIRECTORY_FORMAT, self._map, HEADER_SIZE + i * DIRECTORY_SIZE)
+            self.offsets[tuple(code for code in codes if code)] = offset
+        self.max_pieces = max((len(signature) for signature in self.offsets), default=0)
+
+    def probe(self, board, turn):
+        found = board_signature(board)
+        if found is None or found[0] not in self.offsets:
+            return None
+        signature, squares = found
+        return self._map[self.offsets[signature] + position_index(squares, turn)]
+
+    def best_move(self, board, turn, moves, rng = random):
+        """
+        (move, distance) for the side to move: the quickest win, else a move
+        that holds the draw, else the slowest loss. distance counts plies to
+        mate, odd when the side to move mates and even when it is mated, and
+        is None for a draw. None when a successor is not covered by the
+        tablebase.
+        """
+        other = turn ^ COLOUR_BITS
+        scored = []
+        for move in moves:
+            child = list(board)
+            raw_move_piece(child, move)
+            value = self.probe(child, other)
+            if value is None or value == INVALID:
+                return None
+            scored.append((move, value))
+
+        losses = [(value, move) for move, value in scored if value != DRAW and value % 2 == 0]
+        if losses:
+            value = min(value for value, _ in losses)
+            return rng.choice([move for v, move in losses if v == value]), value - 1
+        draws = [move for move, value in scored if value == DRAW]
+        if draws:
+            return rng.choice(draws), None
+        if not scored:
+            return None
+        value = max(value for _, value in scored)
+        return rng.choice([move for move, v in scored if v == value]), value - 1
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+_tablebase = None
+_tablebase_path = None
+_tablebase_lock = threading.Lock()
+
+
+def get_tablebase(path = None):
+    """
+    The shared tablebase for path (CHESS_TABLEBASE_PATH by default), opened
+    on first use. None when there is no tablebase file. As with the opening
+    book, a replaced tablebase is not closed under threads still probing it.
+    """
+    global _tablebase, _tablebase_path
+    path = path or DEFAULT_TABLEBASE_PATH
+    with _tablebase_lock:
+        if _tablebase is not None and _tablebase_path == path:
+            return _tablebase
+        if not os.path.exists(path):
+            return None
+        _tablebase = Tablebase(path)
+        _tablebase_path = path
+        return _tablebase
+
+
+def probe_tablebase(game, rng = random, path = None):
+    """
+    (move, distance) from the tablebase for the game's position, or None
+    when the tablebase does not cover it. distance is as in
+    Tablebase.best_move: plies to mate, odd when the side to move mates,
+    even when it is mated, None for a draw. The legal moves are only
+    generated once the tablebase is known to cover the position.
+    """
+    tablebase = get_tablebase(path)
+    if tablebase is None:
+        return None
+    board = game["board"]
+    pieces = sum(1 for piece in board if piece != EMPTY)
+    if pieces > tablebase.max_pieces or tablebase.probe(board, game["turn"]) is None:
+        return None
+    moves = get_legal_moves(board, game["turn"])
+    if not moves:
+        return None
+    return tablebase.best_move(board, game["turn"], moves, rng)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build endgame tablebases")
+    parser.add_argument("tables", nargs="+", help="e.g. KQK KRK KQKR; smaller tables they need are built too")
+    parser.add_argument("--output", default=DEFAULT_TABLEBASE_PATH)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    for name in args.tables:
+        if len(parse_signature(name)) > MAX_PIECES:
+            parser.error(f"{name}: at most {MAX_PIECES} pieces")
+    build_tablebase(args.tables, args.output, args.workers)
+    print(f"written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import os, threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# Rough cost of one filled slot: the list pointer plus an entry tuple and its ints.
+ENTRY_BYTES = 160
+
+DEFAULT_MEGABYTES = int(os.environ.get("CHESS_TT_MB", 32))
+# tables of DEFAULT_MEGABYTES a TablePool keeps, lent or idle
+DEFAULT_MAX_TABLES = int(os.environ.get("CHESS_TT_TABLES", 4))
+
+
+class TranspositionTable:
+    """
+    Fixed-size, always-allocated table indexed by key % size.
+    Entries are (key, depth, score, bound, best_move, age). Scores are stored
+    from the point of view of the side to move at the stored position.
+    A slot is overwritten when the new entry is at least as deep as the old
+    one or the old one was left behind by an earlier search.
+    """
+
+    def __init__(self, max_megabytes = DEFAULT_MEGABYTES):
+        self.resize(max_megabytes)
+
+    def resize(self, max_megabytes):
+        self.max_megabytes = max_megabytes
+        self.size = max(1, int(max_megabytes * 1024 * 1024) // ENTRY_BYTES)
+        self.clear()
+
+    def clear(self):
+        self.slots = [None] * self.size
+        self.age = 0
+        self.filled = 0
+
+    def new_search(self):
+        self.age += 1
+
+    def probe(self, key):
+        entry = self.slots[key % self.size]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, bound, best_move):
+        index = key % self.size
+        old = self.slots[index]
+        if old is None:
+            self.filled += 1
+        elif old[0] != key and old[5] == self.age and old[1] > depth:
+            return
+        elif old[0] == key and old[1] > depth and old[5] == self.age and bound != EXACT:
+            return
+        self.slots[index] = (key, depth, score, bound, best_move, self.age)
+
+    def usage(self):
+        return self.filled / self.size
+
+
+class TablePool:
+    """
+    Transposition tables lent to one search at a time, so searches running
+    in different threads never share a table. kind is any hashable the
+    caller uses to keep searches whose scores do not mix on separate tables.
+    Each kind keeps the table returned last, so consecutive searches (and a
+    search after the ponder search it follows) still start from a warm one.
+    The pool holds at most max_tables tables: past that a search gets the
+    idle table of the kind used least recently, cleared, and tables returned
+    beyond the cap are dropped. A search never waits for a table, so while
+    more than max_tables searches run at once there is one table each.
+    """
+
+    def __init__(self, max_megabytes = DEFAULT_MEGABYTES, max_tables = DEFAULT_MAX_TABLES):
+        self.max_megabytes = max_megabytes
+        self.max_tables = max_tables
+        # kind -> idle table, least recently returned first
+        self._idle = OrderedDict()
+        self._lent = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def borrow(self, kind = None):
+        recycled = False
+        with self._lock:
+            table = self._idle.pop(kind, None)
+            if table is None and self._idle and self._lent + len(self._idle) >= self.max_tables:
+                table = self._idle.popitem(last=False)[1]
+                recycled = True
+            self._lent += 1
+        if table is None:
+            table = TranspositionTable(self.max_megabytes)
+        elif recycled:
+            table.clear()
+        try:
+            yield table
+        finally:
+            self._give_back(kind, table)
+
+    def _give_back(self, kind, table):
+        with self._lock:
+            self._lent -= 1
+            # a newer table of the kind replaces an idle one
+            self._idle.pop(kind, None)
+            while self._idle and self._lent + len(self._idle) >= self.max_tables:
+                self._idle.popitem(last=False)
+            if self._lent + len(self._idle) < self.max_tables:
+                self._idle[kind] = table
+
+    def clear(self):
+        with self._lock:
+            self._idle.clear()
@@ -131,3 +131,50 @@ def get_hv_rules(bit_pos, limit_range = False):
             append_if_not_empty(diag_rules, [bit_pos - 9])
 
     return horizontal_rules, vertical_rules, diag_rules
+
+
+# ------------------------------------------------------------------------------------------ #
+# ---------------------------------- MOVE TABLES ------------------------------------------- #
+# ------------------------------------------------------------------------------------------ #
+
+# Nothing below depends on board contents, so the rays and jump targets for every
+# square are built once at import and move generation only reads them.
+
+# (offset, row step, col step) in the order the knight moves have always been generated
+KNIGHT_JUMPS = [
+    (15, 2, -1), (17, 2, 1), (6, 1, -2), (10, 1, 2),
+    (-15, -2, 1), (-17, -2, -1), (-6, -1, 2), (-10, -1, -2)
+]
+
+def get_knight_targets(bit_pos):
+    row = bit_pos // 8
+    col = bit_pos % 8
+    targets = []
+    for offset, row_step, col_step in KNIGHT_JUMPS:
+        if 0 <= row + row_step <= 7 and 0 <= col + col_step <= 7:
+            targets.append(bit_pos + offset)
+    return targets
+
+def _rays(rules):
+    return tuple(tuple(rule) for rule in rules)
+
+ROOK_RAYS = []
+BISHOP_RAYS = []
+QUEEN_RAYS = []
+KING_TARGETS = []
+KNIGHT_TARGETS = []
+
+for _pos in range(64):
+    _hor, _vert, _diags = get_hv_rules(_pos)
+    ROOK_RAYS.append(_rays([*_hor, *_vert]))
+    BISHOP_RAYS.append(_rays(_diags))
+    QUEEN_RAYS.append(_rays([*_hor, *_vert, *_diags]))
+    _hor, _vert, _diags = get_hv_rules(_pos, limit_range=True)
+    KING_TARGETS.append(tuple(rule[0] for rule in [*_hor, *_vert, *_diags]))
+    KNIGHT_TARGETS.append(tuple(get_knight_targets(_pos)))
+
+ROOK_RAYS = tuple(ROOK_RAYS)
+BISHOP_RAYS = tuple(BISHOP_RAYS)
+QUEEN_RAYS = tuple(QUEEN_RAYS)
+KING_TARGETS = tuple(KING_TARGETS)
+KNIGHT_TARGETS = tuple(KNIGHT_TARGETS)
@@ -0,0 +1,104 @@
+from chess.chess_functions import *
+
+# Compact game responses for polling clients. Instead of the 8x8 fancy board
+# and the whole move history, a compact response carries the board as a FEN
+# piece placement and only the moves the client has not seen. Every response
+# has a version, "<ply>:<history key>", where the key is a running hash of
+# every move played so far (not of the position, which a takeback and a
+# different replay can reach again at the same ply). A client that sends
+# back the version it holds gets {"unchanged": true} when nothing has moved,
+# or the moves from its ply onwards when its history is a prefix of the
+# game's. A poll hashes the move list once, a few integer operations a move.
+
+# 64-bit FNV-1a style mixing of one move code into the running key
+HISTORY_OFFSET = 0xcbf29ce484222325
+HISTORY_PRIME = 0x100000001b3
+HISTORY_MASK = (1 << 64) - 1
+
+FEN_PIECES = {
+    Colour.WHITE | Piece.PAWN : "P", Colour.WHITE | Piece.KNIGHT : "N", Colour.WHITE | Piece.BISHOP : "B",
+    Colour.WHITE | Piece.ROOK : "R", Colour.WHITE | Piece.QUEEN : "Q", Colour.WHITE | Piece.KING : "K",
+    Colour.BLACK | Piece.PAWN : "p", Colour.BLACK | Piece.KNIGHT : "n", Colour.BLACK | Piece.BISHOP : "b",
+    Colour.BLACK | Piece.ROOK : "r", Colour.BLACK | Piece.QUEEN : "q", Colour.BLACK | Piece.KING : "k",
+}
+
+
+def get_fen(board, turn):
+    """
+    Piece placement and side to move, e.g. 'rnbqkbnr/.../RNBQKBNR w'.
+    """
+    ranks = []
+    for rank in range(7, -1, -1):
+        text, empty = "", 0
+        for piece in board[rank * 8:rank * 8 + 8]:
+            if piece == EMPTY:
+                empty += 1
+                continue
+            if empty:
+                text += str(empty)
+                empty = 0
+            text += FEN_PIECES[piece & (COLOUR_BITS | PIECE_BITS)]
+        if empty:
+            text += str(empty)
+        ranks.append(text)
+    return f"{'/'.join(ranks)} {IDS_TO_COLOUR[turn]}"
+
+
+def square(pos):
+    return get_position(pos) if isinstance(pos, str) else pos
+
+
+def history_keys(moves):
+    """
+    keys[ply] is the key of the first ply moves, for ply 0 to len(moves).
+    """
+    key = HISTORY_OFFSET
+    keys = [key]
+    for (move, (piece, captured)) in moves:
+        code = ((square(move[0]) * 64 + square(move[1])) * 32 + piece) * 32 + captured
+        key = ((key ^ code) * HISTORY_PRIME) & HISTORY_MASK
+        keys.append(key)
+    return keys
+
+
+def format_version(ply, key):
+    return f"{ply}:{key:016x}"
+
+
+def get_game_version(game):
+    return format_version(len(game["moves"]), history_keys(game["moves"])[-1])
+
+
+def parse_version(version):
+    try:
+        ply, key = version.split(":")
+        return int(ply), int(key, 16)
+    except (AttributeError, ValueError):
+        return None
+
+
+def get_compact_game(game, since = None):
+    """
+    The compact response for game. With since (a version the client holds)
+    it is {"unchanged": true} when the game is still there, or the moves
+    after the client's ply when the client's history is a prefix of the game's.
+    Anything else, including an unknown or stale version, gets the full move list.
+    """
+    keys = history_keys(game["moves"])
+    version = format_version(len(game["moves"]), keys[-1])
+    if since == version:
+        return {"unchanged" : True, "version" : version}
+
+    offset = 0
+    known = parse_version(since)
+    if known is not None:
+        ply, key = known
+        if 0 <= ply < len(keys) and keys[ply] == key:
+            offset = ply
+    return {
+        "version" : version,
+        "fen" : get_fen(game["board"], game["turn"]),
+        "turn" : IDS_TO_COLOUR[game["turn"]],
+        "moves_offset" : offset,
+        "moves" : [get_move_notation(move) for move, _ in game["moves"][offset:]],
+    }
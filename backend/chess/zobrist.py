@@ -0,0 +1,33 @@
+import random
+
+# Zobrist keys: one random 64-bit number per (piece code, square) and one for
+# black to move. The generator is seeded so keys, and anything stored under
+# them, are the same in every process.
+
+ZOBRIST_SEED = 20250101
+PIECE_CODES = 32
+BLACK = 0b01000
+
+_rng = random.Random(ZOBRIST_SEED)
+PIECE_KEYS = tuple(tuple(_rng.getrandbits(64) for sq in range(64)) for piece in range(PIECE_CODES))
+BLACK_TO_MOVE_KEY = _rng.getrandbits(64)
+
+
+def compute_hash(board, turn):
+    key = 0
+    for sq, piece in enumerate(board):
+        if piece:
+            key ^= PIECE_KEYS[piece][sq]
+    if turn == BLACK:
+        key ^= BLACK_TO_MOVE_KEY
+    return key
+
+
+def update_hash(key, piece, captured, initial_pos, final_pos):
+    """
+    XORs a move in or out of key, so the same call makes and unmakes it.
+    """
+    key ^= PIECE_KEYS[piece][initial_pos] ^ PIECE_KEYS[piece][final_pos] ^ BLACK_TO_MOVE_KEY
+    if captured:
+        key ^= PIECE_KEYS[captured][final_pos]
+    return key
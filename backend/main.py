@@ -1,25 +1,78 @@
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
+import json, math
 import chess.chess_functions as chess_functions
 import chess.botV2 as bot
+import chess.parallel as parallel
+from chess.game_store import GameStore, snapshot_game
+from chess.bot_jobs import BotJobManager, FINISHED_STATES
+import chess.ponder as pondering
+import chess.analysis as analysis
+from chess.move_cache import MoveCache, describe_move_map
+from chess.wire_format import get_compact_game
 
 app = Flask(__name__)
 CORS(app)
 
+# live matches are served from memory and written back in the background
+store = GameStore()
+
+# move maps of recently seen positions, shared by every match
+move_cache = MoveCache()
+
+# seconds between keepalive comments on an idle event stream
+SSE_KEEPALIVE = 15
+
 @app.route("/test", methods=["GET"])
 def test():
     return jsonify({"message": "hello world"})
 
+def status_from_move_map(game, move_map):
+    # the cached move map already says whether the side to move has a move
+    in_check = chess_functions.is_in_check(game["board"], game["turn"])
+    if any(move_map.values()):
+        return "check" if in_check else "playing"
+    return "checkmate" if in_check else "stalemate"
+
+def add_moves_and_status(response, game):
+    # the client highlights moves from this map instead of asking per click
+    move_map = move_cache.get_move_map(game["board"], game["turn"])
+    response["move_map"] = describe_move_map(move_map)
+    response["status"] = status_from_move_map(game, move_map)
+    return response
+
+def get_fancy_game_with_moves(game):
+    return add_moves_and_status(chess_functions.get_fancy_game(game), game)
+
+def no_moves_response(game):
+    return jsonify({"error": "NO_MOVES_AVAILABLE", "status": chess_functions.get_game_status(game["board"], game["turn"])}), 409
+
+def describe_game(game, data):
+    """
+    The game as the client asked for it: the fancy game by default, or with
+    "format": "compact" a FEN and the moves after the client's "since" version.
+    """
+    if data.get("format") != "compact":
+        return get_fancy_game_with_moves(game)
+    compact_game = get_compact_game(game, data.get("since"))
+    if not compact_game.get("unchanged"):
+        add_moves_and_status(compact_game, game)
+    return compact_game
+
 @app.route("/get_game", methods=["POST"])
 def get_game():
     data = request.json
     print(data)
     name = data.get("matchname", "default")
     
-    game = chess_functions.load_game(name)
+    with store.lock(name):
+        game = store.get(name)
+        if not game:
+            return jsonify({"error": "MATCH_NOT_FOUND"}), 404
+        fancy_game = describe_game(game, data)
 
-    return jsonify(chess_functions.get_fancy_game(game))
+    return jsonify(fancy_game)
 
 @app.route("/move_piece", methods=["POST"])
 def move_piece():
@@ -31,10 +84,17 @@ def move_piece():
     print(move_pos1, flush=True)
     print(move_pos2, flush=True)
     move = (move_pos1, move_pos2)
-    game = chess_functions.load_game(matchname)
-    game = chess_functions.move_piece(game, move)
-    chess_functions.save_game(game, matchname)
-    game = chess_functions.get_fancy_game(game)
+    with store.lock(matchname):
+        game = store.get(matchname)
+        if not game:
+            return jsonify({"error": "MATCH_NOT_FOUND"}), 404
+        plies_before = len(game["moves"])
+        game = chess_functions.move_piece(game, move)
+        # a rejected move leaves the game (and the ponder guess) as it was
+        if len(game["moves"]) > plies_before:
+            store.mark_dirty(matchname)
+            pondering.opponent_moved(matchname, game)
+        game = describe_game(game, data)
 
     return jsonify(game)
 
@@ -43,47 +103,308 @@ def get_piece_moves():
     data = request.json
     matchname = data.get("matchname", "default")
     piece_pos = data.get("piece_position", 'a1')
-    game = chess_functions.load_game(matchname)
-    moves = chess_functions.get_piece_moves(game["board"], piece_pos)
+    with store.lock(matchname):
+        game = store.get(matchname)
+        if not game:
+            return jsonify({"error": "MATCH_NOT_FOUND"}), 404
+        square = chess_functions.get_position(piece_pos) if isinstance(piece_pos, str) else piece_pos
+        moves = move_cache.get_piece_moves(game["board"], game["turn"], square)
+        new_board = list(game["board"])
     print(moves)
-    new_board = game["board"]
     new_board = chess_functions.mark_board(new_board, moves)
     fancy_new_board = chess_functions.get_fancy_board(new_board)
     return jsonify(fancy_new_board)
 
+def positive_number(value, convert, error):
+    """
+    value as a positive, finite number of type convert, or None when the
+    request leaves it out. Anything else raises ValueError(error).
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(error)
+    try:
+        value = convert(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(error)
+    if not 0 < value < math.inf:
+        raise ValueError(error)
+    return value
+
+def get_workers(data, name, error):
+    # more processes than the pool holds are cut down to its size
+    workers = positive_number(data.get(name, parallel.DEFAULT_WORKERS), int, error)
+    if workers is None:
+        raise ValueError(error)
+    return parallel.clamp_workers(workers)
+
+def get_seed(data):
+    seed = data.get("seed")
+    if seed is None:
+        return None
+    if isinstance(seed, bool):
+        raise ValueError("INVALID_SEED")
+    try:
+        return int(seed)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("INVALID_SEED")
+
+def get_search_options(data):
+    """
+    search_best_move keyword arguments from a request body.
+    """
+    backend = data.get("backend", "list")
+    if backend not in bot.BACKENDS:
+        raise ValueError("UNKNOWN_BACKEND")
+    evaluator = data.get("evaluator", "material")
+    if evaluator not in bot.EVALUATORS:
+        raise ValueError("UNKNOWN_EVALUATOR")
+
+    try:
+        max_depth = int(data.get("max_depth", bot.DEFAULT_DEPTH))
+    except (TypeError, ValueError):
+        raise ValueError("INVALID_DEPTH")
+    if not 1 <= max_depth < bot.MAX_PLY:
+        raise ValueError("INVALID_DEPTH")
+
+    # optional per-request budget; the deepest finished iteration wins
+    time_limit = positive_number(data.get("time_limit"), float, "INVALID_TIME_LIMIT")
+    node_limit = positive_number(data.get("node_limit"), int, "INVALID_NODE_LIMIT")
+    return {
+        "backend" : backend,
+        "max_depth" : max_depth,
+        "time_limit" : time_limit,
+        "node_limit" : node_limit,
+        "workers" : get_workers(data, "workers", "INVALID_WORKERS"),
+        "seed" : get_seed(data),
+        # search counters are only collected when the client asks for them
+        "collect_stats" : bool(data.get("stats", False)),
+        "use_book" : bool(data.get("book", True)),
+        "use_tablebase" : bool(data.get("tablebase", True)),
+        "evaluator" : evaluator,
+        "quiescence" : bool(data.get("quiescence", True)),
+    }
+
+def describe_search_result(result):
+    move = result["move"]
+    return {
+        "depth" : result["depth"],
+        "score" : result["score"],
+        "from" : chess_functions.get_coordinate(move[0]) if move else None,
+        "to" : chess_functions.get_coordinate(move[1]) if move else None,
+        "nodes" : result.get("nodes"),
+        "elapsed" : result.get("elapsed"),
+        "book" : result.get("book", False),
+        "tablebase" : result.get("tablebase", False),
+        "distance" : result.get("distance"),
+    }
+
+def ponder_applies(options):
+    # ponders search serially with the default evaluation, so only such a
+    # request can take over their result
+    return options["workers"] <= 1 and options["seed"] is None and options["evaluator"] == "material" and options["quiescence"]
+
+def search_or_ponder(game, matchname, options):
+    # a correct ponder that already reached the requested depth answers at once
+    ordering = None
+    if ponder_applies(options):
+        result, ordering = pondering.take_ponder_result(matchname, game, options["max_depth"])
+        if result is not None:
+            return result
+    else:
+        pondering.stop_pondering(matchname)
+    return bot.search_best_move(game, **options, ordering=ordering)
+
+def apply_bot_move(game, matchname, result, ponder = False, options = None):
+    """
+    Plays the searched move on the live game; the caller holds the match lock.
+    With ponder set, the engine starts thinking about the expected reply.
+    """
+    bot_move = result["move"]
+    game = chess_functions.move_piece(game, bot_move)
+    store.mark_dirty(matchname)
+    if ponder:
+        pondering.start_pondering(matchname, game, options["max_depth"], options["backend"], options["time_limit"], options["node_limit"])
+
+    fancy_game = get_fancy_game_with_moves(game)
+
+    fancy_game["last_move"] = {
+        "from": chess_functions.get_coordinate(bot_move[0]),
+        "to": chess_functions.get_coordinate(bot_move[1]),
+    }
+    if "stats" in result:
+        fancy_game["stats"] = result["stats"]
+    return fancy_game
+
 @app.route("/get_bot_move", methods=["POST"])
 def get_bot_move():
     data = request.json
     matchname = data.get("matchname", "default")
-    game = chess_functions.load_game(matchname)
+    with store.lock(matchname):
+        return bot_move_locked(data, matchname)
+
+def bot_move_locked(data, matchname):
+    game = store.get(matchname)
     if not game:
         return jsonify({"error": "MATCH_NOT_FOUND"}), 404
 
     possible_moves = bot.get_all_possible_moves(game)
     if not possible_moves:
-        return jsonify({"error": "NO_MOVES_AVAILABLE"}), 409
+        return no_moves_response(game)
 
-    bot_move = bot.get_bot_move(game)
-    game = chess_functions.move_piece(game, bot_move)
-    chess_functions.save_game(game, matchname)
+    try:
+        options = get_search_options(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    fancy_game = chess_functions.get_fancy_game(game)
+    ponder = bool(data.get("ponder", False))
+    result = search_or_ponder(game, matchname, options)
+    return jsonify(apply_bot_move(game, matchname, result, ponder, options))
 
-    def position_to_coordinate(position):
-        if isinstance(position, str):
-            return position
-        files = "abcdefgh"
-        file_index = position % 8
-        rank_index = position // 8 + 1
-        return f"{files[file_index]}{rank_index}"
 
-    fancy_game["last_move"] = {
-        "from": position_to_coordinate(bot_move[0]),
-        "to": position_to_coordinate(bot_move[1]),
-    }
-    return jsonify(fancy_game)
+
+# ------------------------------------------------------------------------------------------ #
+# ------------------------------------- BOT JOBS ------------------------------------------- #
+# ------------------------------------------------------------------------------------------ #
+
+jobs = BotJobManager()
+
+def run_bot_job(job, options, ponder = False):
+    # search a snapshot without holding the match lock, so polls keep working
+    with store.lock(job.matchname):
+        game = store.get(job.matchname)
+        if not game:
+            raise ValueError("MATCH_NOT_FOUND")
+        snapshot = snapshot_game(game)
+
+    def publish_iteration(result):
+        job.publish(describe_search_result(result))
+
+    result, ordering = None, None
+    if ponder_applies(options):
+        result, ordering = pondering.take_ponder_result(job.matchname, snapshot, options["max_depth"])
+    else:
+        pondering.stop_pondering(job.matchname)
+    if result is None:
+        result = bot.search_best_move(snapshot, **options, on_iteration=publish_iteration, stop_event=job.stop_event, ordering=ordering)
+    if job.stop_event.is_set():
+        return None
+    if result["move"] is None:
+        raise ValueError("NO_MOVE_FOUND")
+
+    with store.lock(job.matchname):
+        game = store.get(job.matchname)
+        if not game:
+            raise ValueError("MATCH_NOT_FOUND")
+        if game["board"] != snapshot["board"] or len(game["moves"]) != len(snapshot["moves"]):
+            raise ValueError("GAME_CHANGED")
+        fancy_game = apply_bot_move(game, job.matchname, result, ponder, options)
+    job.publish(dict(describe_search_result(result), final=True))
+    return fancy_game
+
+@app.route("/bot_jobs", methods=["POST"])
+def start_bot_job():
+    data = request.json
+    matchname = data.get("matchname", "default")
+    with store.lock(matchname):
+        game = store.get(matchname)
+        if not game:
+            return jsonify({"error": "MATCH_NOT_FOUND"}), 404
+        if not bot.get_all_possible_moves(game):
+            return no_moves_response(game)
+
+    try:
+        options = get_search_options(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # a job streams its iterations and can be cancelled, which only the
+    # serial search supports
+    if "workers" in data and options["workers"] > 1:
+        return jsonify({"error": "PARALLEL_JOB_UNSUPPORTED"}), 400
+    options["workers"] = 1
+
+    ponder = bool(data.get("ponder", False))
+    job = jobs.submit(matchname, lambda job: run_bot_job(job, options, ponder))
+    return jsonify(job.to_dict()), 202
+
+@app.route("/bot_jobs/<job_id>", methods=["GET"])
+def get_bot_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "JOB_NOT_FOUND"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/bot_jobs/<job_id>", methods=["DELETE"])
+def cancel_bot_job(job_id):
+    job = jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "JOB_NOT_FOUND"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/bot_jobs/<job_id>/events", methods=["GET"])
+def stream_bot_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "JOB_NOT_FOUND"}), 404
+
+    def events():
+        seen = 0
+        while True:
+            updates = job.wait_for_update(seen, timeout=SSE_KEEPALIVE)
+            for update in updates:
+                yield f"event: update\ndata: {json.dumps(update)}\n\n"
+            seen += len(updates)
+            if job.status in FINISHED_STATES and seen == len(job.updates):
+                yield f"event: done\ndata: {json.dumps(job.to_dict())}\n\n"
+                return
+            if not updates:
+                yield ": keepalive\n\n"
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
     
 
 
+# ------------------------------------------------------------------------------------------ #
+# ---------------------------------- BATCH ANALYSIS ---------------------------------------- #
+# ------------------------------------------------------------------------------------------ #
+
+def stored_positions(matchnames):
+    for matchname in matchnames:
+        with store.lock(matchname):
+            game = store.get(matchname)
+            snapshot = snapshot_game(game) if game else None
+        if snapshot is not None:
+            yield matchname, snapshot
+
+@app.route("/analyze_batch", methods=["POST"])
+def analyze_batch():
+    """
+    Analyses "positions" (game dicts, each with an optional "id") and/or the
+    stored "matchnames", streaming one JSON result per line as they finish.
+    """
+    data = request.json
+    try:
+        options = get_search_options(data)
+        batch_workers = get_workers(data, "batch_workers", "INVALID_BATCH_WORKERS")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # the batch is spread over processes, so each search stays serial
+    options["workers"] = 1
+    options.pop("collect_stats")
+
+    def positions():
+        for index, game in enumerate(data.get("positions", [])):
+            yield str(game.get("id", index)), game
+        yield from stored_positions(data.get("matchnames", []))
+
+    def results():
+        for result in analysis.analyze_batch(positions(), batch_workers, options):
+            yield json.dumps(result) + "\n"
+
+    return Response(stream_with_context(results()), mimetype="application/x-ndjson")
+
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8000, debug=True)
\ No newline at end of file
@@ -0,0 +1,126 @@
+import random
+from chess.chess_functions import *
+from chess.position import Position
+from chess.bitboard import BitboardPosition
+
+
+def place(pieces):
+    """
+    {'e1' : Colour.WHITE | Piece.KING, ...} -> board
+    """
+    board = [EMPTY] * 64
+    for coordinate, piece in pieces.items():
+        board[get_position(coordinate)] = piece
+    return board
+
+
+def king_capturable(board, colour):
+    # the pre-legality rule: an enemy piece can move onto colour's king
+    king_sq = find_king(board, colour)
+    for sq, piece in enumerate(board):
+        if piece != EMPTY and piece & COLOUR_BITS != colour and king_sq in get_piece_moves(board, sq):
+            return True
+    return False
+
+
+def make_and_test(board, colour):
+    legal = []
+    for sq, piece in enumerate(board):
+        if piece == EMPTY or piece & COLOUR_BITS != colour:
+            continue
+        for target in get_piece_moves(board, sq):
+            child = list(board)
+            raw_move_piece(child, (sq, target))
+            if not king_capturable(child, colour):
+                legal.append([sq, target])
+    return legal
+
+
+def random_positions(games, plies, seed):
+    rng = random.Random(seed)
+    for _ in range(games):
+        game = new_game()
+        for _ in range(plies):
+            yield game["board"], game["turn"]
+            moves = get_legal_moves(game["board"], game["turn"])
+            if not moves:
+                break
+            move_piece(game, rng.choice(moves))
+
+
+def test_legal_moves_match_make_and_test():
+    checked = 0
+    for board, turn in random_positions(games=40, plies=120, seed=0):
+        assert get_legal_moves(board, turn) == make_and_test(board, turn)
+        checked += 1
+    assert checked > 1000
+
+
+def test_backends_generate_the_legal_moves():
+    for board, turn in random_positions(games=5, plies=80, seed=1):
+        legal = get_legal_moves(board, turn)
+        assert Position(board, turn).generate_moves() == legal
+        assert BitboardPosition(board, turn).generate_moves() == legal
+
+
+def test_pinned_piece_stays_on_the_pin():
+    board = place({
+        "e1" : Colour.WHITE | Piece.KING,
+        "e2" : Colour.WHITE | Piece.ROOK,
+        "e8" : Colour.BLACK | Piece.ROOK,
+        "a8" : Colour.BLACK | Piece.KING,
+    })
+    checkers, pins = get_checks_and_pins(board, Colour.WHITE, get_position("e1"))
+    assert checkers == {}
+    assert pins.keys() == {get_position("e2")}
+    rook_targets = {target for sq, target in get_legal_moves(board, Colour.WHITE) if sq == get_position("e2")}
+    assert rook_targets == {get_position(c) for c in ("e3", "e4", "e5", "e6", "e7", "e8")}
+
+
+def test_double_check_allows_only_king_moves():
+    board = place({
+        "e1" : Colour.WHITE | Piece.KING,
+        "a1" : Colour.WHITE | Piece.ROOK,
+        "e8" : Colour.BLACK | Piece.ROOK,
+        "d3" : Colour.BLACK | Piece.KNIGHT,
+        "a8" : Colour.BLACK | Piece.KING,
+    })
+    checkers, _ = get_checks_and_pins(board, Colour.WHITE, get_position("e1"))
+    assert set(checkers) == {get_position("e8"), get_position("d3")}
+    assert {sq for sq, _ in get_legal_moves(board, Colour.WHITE)} == {get_position("e1")}
+
+
+def test_king_cannot_step_back_along_a_checking_line():
+    board = place({
+        "e4" : Colour.WHITE | Piece.KING,
+        "e8" : Colour.BLACK | Piece.ROOK,
+        "a8" : Colour.BLACK | Piece.KING,
+    })
+    targets = {target for _, target in get_legal_moves(board, Colour.WHITE)}
+    assert get_position("e3") not in targets
+    assert get_position("d3") in targets
+
+
+def test_game_status():
+    mate = place({
+        "h8" : Colour.BLACK | Piece.KING,
+        "g6" : Colour.WHITE | Piece.KING,
+        "a8" : Colour.WHITE | Piece.QUEEN,
+    })
+    assert get_game_status(mate, Colour.BLACK) == "checkmate"
+
+    stalemate = place({
+        "h8" : Colour.BLACK | Piece.KING,
+        "g6" : Colour.WHITE | Piece.KING,
+        "f7" : Colour.WHITE | Piece.QUEEN,
+    })
+    assert get_game_status(stalemate, Colour.BLACK) == "stalemate"
+
+    check = place({
+        "h8" : Colour.BLACK | Piece.KING,
+        "a1" : Colour.WHITE | Piece.KING,
+        "a8" : Colour.WHITE | Piece.QUEEN,
+    })
+    assert get_game_status(check, Colour.BLACK) == "check"
+
+    assert get_game_status(new_game()["board"], Colour.WHITE) == "playing"
@@ -0,0 +1,33 @@
+import pytest
+from chess.chess_functions import new_game
+from chess.perft import perft
+from chess.position import Position
+from chess.bitboard import BitboardPosition
+from benchmarks.parallel_search import load_positions
+
+# Leaf counts at depths 1 to 3 under this project's rules (single pawn
+# pushes only, no castling, promotion or en passant), checked once against
+# a make-and-test generator. The stored positions come from
+# benchmarks/positions.json.
+PERFT_COUNTS = {
+    "start" : [12, 144, 2124],
+    "random_11_ply6" : [25, 548, 14119],
+    "random_12_ply12" : [23, 459, 11797],
+    "random_13_ply20" : [27, 724, 20188],
+    "random_14_ply30" : [17, 392, 6351],
+    "random_15_ply44" : [5, 190, 5596],
+}
+
+
+def get_game(name):
+    if name == "start":
+        return new_game()
+    return next(position for position in load_positions() if position["name"] == name)
+
+
+@pytest.mark.parametrize("backend", [Position, BitboardPosition], ids=["list", "bitboard"])
+@pytest.mark.parametrize("name", PERFT_COUNTS)
+def test_perft(backend, name):
+    game = get_game(name)
+    position = backend(game["board"], game["turn"])
+    assert [perft(position, depth) for depth in (1, 2, 3)] == PERFT_COUNTS[name]
@@ -0,0 +1,32 @@
+from chess.chess_functions import *
+from chess.wire_format import get_compact_game
+
+
+def play(game, *coordinates):
+    for initial, final in coordinates:
+        move_piece(game, [get_position(initial), get_position(final)])
+    return game
+
+
+def test_unchanged_and_delta():
+    game = play(new_game(), ("b1", "c3"))
+    version = get_compact_game(game)["version"]
+    assert get_compact_game(game, version)["unchanged"]
+
+    play(game, ("b8", "c6"))
+    response = get_compact_game(game, version)
+    assert response["moves_offset"] == 1
+    assert response["moves"] == ["b8c6"]
+
+
+def test_same_position_by_other_moves_is_not_unchanged():
+    # both games reach the starting position again after four plies
+    game = play(new_game(), ("b1", "c3"), ("b8", "c6"), ("c3", "b1"), ("c6", "b8"))
+    version = get_compact_game(game)["version"]
+    for _ in range(4):
+        unmove_piece(game)
+    play(game, ("g1", "f3"), ("g8", "f6"), ("f3", "g1"), ("f6", "g8"))
+    response = get_compact_game(game, version)
+    assert "unchanged" not in response
+    assert response["moves_offset"] == 0
+    assert response["moves"] == ["g1f3", "g8f6", "f3g1", "f6g8"]
@@ -23,6 +23,8 @@ const state = {
   backendUrl: "http://127.0.0.1:8000",
   matchName: "default",
   game: null,
+  // version of state.game as last sent by /get_game in compact format
+  gameVersion: null,
   selectedSquare: null,
   lastMove: null,
   availableMoves: new Set(),
@@ -55,6 +57,20 @@ function setMessage(text, type = "neutral") {
   }
 }
 
+function describeStatus(game) {
+  const side = game?.turn === "w" ? "White" : "Black";
+  if (game?.status === "checkmate") {
+    return `Checkmate, ${side} is mated.`;
+  }
+  if (game?.status === "stalemate") {
+    return "Stalemate, the game is drawn.";
+  }
+  if (game?.status === "check") {
+    return `${side} is in check.`;
+  }
+  return "";
+}
+
 function updateIndicators() {
   const turn = state.game?.turn;
   turnIndicator.textContent =
@@ -85,63 +101,95 @@ function handleBotToggleChange() {
   maybeTriggerBot();
 }
 
-async function requestBotMove(turn) {
+const BOT_JOB_POLL_MS = 250;
+
+function sleep(ms) {
+  return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+async function startBotJob() {
   const payload = {
     matchname: state.matchName,
   };
 
-  console.groupCollapsed("[API] /get_bot_move");
-  console.log("URL:", `${state.backendUrl}/get_bot_move`);
+  console.groupCollapsed("[API] /bot_jobs");
+  console.log("URL:", `${state.backendUrl}/bot_jobs`);
   console.log("Headers:", { "Content-Type": "application/json" });
   console.log("Body:", payload);
 
-  try {
-    const response = await fetch(`${state.backendUrl}/get_bot_move`, {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(payload),
-    });
+  const response = await fetch(`${state.backendUrl}/bot_jobs`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(payload),
+  });
 
-    const responseHeaders = {};
-    response.headers.forEach((value, key) => {
-      responseHeaders[key] = value;
-    });
+  if (!response.ok) {
+    console.log("Response status:", response.status, response.statusText);
+    const errorText = await response.text();
+    console.log("Response body:", errorText);
+    console.groupEnd();
+    return null;
+  }
 
+  const job = await response.json();
+  console.log("Response status:", response.status, response.statusText);
+  console.log("Response body:", job);
+  console.groupEnd();
+  return job;
+}
+
+async function waitForBotJob(jobId) {
+  // The search runs in the background on the server; poll until it settles.
+  while (true) {
+    const response = await fetch(`${state.backendUrl}/bot_jobs/${jobId}`);
     if (!response.ok) {
-      console.log("Response status:", response.status, response.statusText);
-      console.log("Response headers:", responseHeaders);
-      const errorText = await response.text();
-      console.log("Response body:", errorText);
-      console.groupEnd();
+      console.log("[API] /bot_jobs poll failed:", response.status, response.statusText);
+      return null;
+    }
+
+    const job = await response.json();
+    if (job.status === "done" || job.status === "cancelled" || job.status === "failed") {
+      console.log("[API] /bot_jobs finished:", job);
+      return job;
+    }
+
+    if (job.latest) {
+      setMessage(`Bot is thinking... depth ${job.latest.depth}, best so far ${job.latest.from}-${job.latest.to}.`);
+    }
+    await sleep(BOT_JOB_POLL_MS);
+  }
+}
+
+async function requestBotMove(turn) {
+  try {
+    const job = await startBotJob();
+    if (!job) {
       setMessage("Bot could not move. Verify the backend state.", "negative");
       return false;
     }
 
-    const data = await response.clone().json();
-
-    console.log("Response status:", response.status, response.statusText);
-    console.log("Response headers:", responseHeaders);
-    console.log("Response body:", data);
-    console.groupEnd();
+    setMessage("Bot is thinking...");
+    const finishedJob = await waitForBotJob(job.job_id);
+    const data = finishedJob?.result;
 
-    if (!data || !Array.isArray(data.board)) {
-      setMessage("Bot returned an invalid game state.", "negative");
+    if (finishedJob?.status !== "done" || !data || !Array.isArray(data.board)) {
+      setMessage("Bot could not move. Verify the backend state.", "negative");
       return false;
     }
 
     state.game = data;
+    state.gameVersion = null;
     state.selectedSquare = null;
     state.availableMoves = new Set();
     state.lastMove = data.last_move ?? null;
 
     const sideLabel = turn === "w" ? "White" : "Black";
-    setMessage(`Bot moved for ${sideLabel}.`, "positive");
+    setMessage(`Bot moved for ${sideLabel}. ${describeStatus(data)}`.trim(), "positive");
 
     renderBoard(state.game);
     return true;
   } catch (error) {
     console.error(error);
-    console.groupEnd();
     setMessage("Bot move failed. Check the backend server.", "negative");
     return false;
   }
@@ -151,6 +199,9 @@ async function maybeTriggerBot() {
   if (!state.game || state.botMoveInProgress) {
     return;
   }
+  if (state.game.status === "checkmate" || state.game.status === "stalemate") {
+    return;
+  }
 
   const turn = state.game.turn;
   const shouldBotMove =
@@ -266,9 +317,52 @@ function coordinateToIndex(coordinate) {
   return rowIndex * 8 + columnIndex;
 }
 
+function fenToBoard(fen) {
+  // Rows from rank 8 down, like the fancy board the backend sends.
+  const [placement] = fen.split(" ");
+  const colourOf = (letter) => (letter === letter.toUpperCase() ? "w" : "b");
+  return placement.split("/").map((rank) => {
+    const row = [];
+    for (const letter of rank) {
+      const empty = Number.parseInt(letter, 10);
+      if (Number.isNaN(empty)) {
+        row.push(`${colourOf(letter)}${letter.toUpperCase()}`);
+      } else {
+        for (let i = 0; i < empty; i += 1) {
+          row.push("");
+        }
+      }
+    }
+    return row;
+  });
+}
+
+function applyCompactGame(data) {
+  // Returns false when the game has not changed since state.gameVersion.
+  if (data.unchanged) {
+    return false;
+  }
+
+  const knownMoves =
+    state.gameVersion && Array.isArray(state.game?.moves)
+      ? state.game.moves.slice(0, data.moves_offset)
+      : [];
+  state.game = {
+    board: fenToBoard(data.fen),
+    turn: data.turn,
+    moves: knownMoves.concat(data.moves),
+    move_map: data.move_map,
+    status: data.status,
+  };
+  state.gameVersion = data.version;
+  return true;
+}
+
 async function fetchGame({ quiet = false } = {}) {
   const payload = {
     matchname: state.matchName,
+    format: "compact",
+    since: state.gameVersion,
   };
 
   console.groupCollapsed("[API] /get_game");
@@ -304,10 +398,17 @@ async function fetchGame({ quiet = false } = {}) {
     console.log("Response body:", data);
     console.groupEnd();
 
-    state.game = data;
+    if (!applyCompactGame(data)) {
+      if (!quiet) {
+        setMessage("Game is up to date.", "positive");
+      }
+      await maybeTriggerBot();
+      return;
+    }
+
     state.selectedSquare = null;
     state.availableMoves = new Set();
-    state.lastMove = data.last_move ?? null;
+    state.lastMove = null;
 
     if (!quiet) {
       setMessage("Game loaded successfully.", "positive");
@@ -372,6 +473,7 @@ async function submitMove(from, to) {
     const boardAfter = JSON.stringify(data.board);
 
     state.game = data;
+    state.gameVersion = null;
     state.selectedSquare = null;
     state.availableMoves = new Set();
 
@@ -380,7 +482,7 @@ async function submitMove(from, to) {
       state.lastMove = null;
     } else {
       state.lastMove = { from, to };
-      setMessage(`Moved from ${from} to ${to}.`, "positive");
+      setMessage(`Moved from ${from} to ${to}. ${describeStatus(data)}`.trim(), "positive");
     }
 
     renderBoard(state.game);
@@ -482,7 +584,11 @@ async function handleSquareClick(squareElement) {
     }
 
     state.selectedSquare = coordinate;
-    state.availableMoves = await fetchAvailableMoves(coordinate);
+    // the move map from the last game response saves a request per click
+    const mappedMoves = state.game.move_map?.[coordinate];
+    state.availableMoves = mappedMoves
+      ? new Set(mappedMoves)
+      : await fetchAvailableMoves(coordinate);
     setMessage(`Piece selected on ${coordinate}. Choose a destination.`);
   } else if (state.selectedSquare === coordinate) {
     state.selectedSquare = null;
@@ -504,11 +610,16 @@ function handleLoadGame() {
   state.matchName = matchInput.value.trim() || state.matchName;
   state.selectedSquare = null;
   state.lastMove = null;
+  state.gameVersion = null;
   fetchGame();
 }
 
 function handleRefreshGame() {
-  state.matchName = matchInput.value.trim() || state.matchName;
+  const matchName = matchInput.value.trim() || state.matchName;
+  if (matchName !== state.matchName) {
+    state.gameVersion = null;
+  }
+  state.matchName = matchName;
   fetchGame({ quiet: true });
 }
 